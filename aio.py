@@ -0,0 +1,95 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+
+
+#----------------------------------------------------------------------------#
+# Async database.
+#----------------------------------------------------------------------------#
+
+class AsyncDatabase:
+    """An asyncpg engine driven by one event loop thread per process.
+
+    Request threads hand coroutines to the loop with run() and block on the
+    result, so the queries of one request run concurrently (each statement
+    of gather() on its own pooled connection) while the connection pool is
+    shared by every thread of the worker. The loop and engine are created
+    lazily, after any fork, by the first request that needs them.
+
+    Disabled unless ASYNC_ENABLED is set; the views then keep using the
+    synchronous session.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.loop = None
+        self.engine = None
+        self.pid = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.url = app.config.get('ASYNC_DATABASE_URI')
+        self.engine_options = {
+            'pool_size': app.config.get('ASYNC_POOL_SIZE', 20),
+            'max_overflow': app.config.get('ASYNC_MAX_OVERFLOW', 20),
+            'pool_pre_ping': True,
+            'connect_args': {'server_settings': {
+                'statement_timeout': str(app.config.get('DB_STATEMENT_TIMEOUT_MS', 30000))}},
+        }
+        self.enabled = bool(app.config.get('ASYNC_ENABLED'))
+        app.extensions['async_db'] = self
+
+    def _start(self):
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine
+        except ImportError:
+            raise RuntimeError('ASYNC_ENABLED needs SQLAlchemy asyncio support (greenlet) and asyncpg installed')
+
+        with self.lock:
+            if self.loop is not None and self.pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='fyyur-async-db', daemon=True)
+            thread.start()
+            # the engine's pool belongs to the loop it is first used on
+            self.engine = create_async_engine(self.url, **self.engine_options)
+            self.loop = loop
+            self.pid = os.getpid()
+
+    def run(self, coro):
+        # runs `coro` on the loop thread and waits for its result; the
+        # coroutine sees the caller's context (Flask's request and app)
+        if self.loop is None or self.pid != os.getpid():
+            self._start()
+        future = concurrent.futures.Future()
+
+        def done(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start():
+            self.loop.create_task(coro).add_done_callback(done)
+
+        self.loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+        return future.result()
+
+    async def fetch(self, statement):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(statement)
+            return result.all()
+
+    async def gather(self, *statements):
+        # one connection per statement, all in flight at once
+        return await asyncio.gather(*(self.fetch(statement) for statement in statements))
+
+    def dispose(self):
+        if self.engine is not None and self.pid == os.getpid():
+            self.run(self.engine.dispose())
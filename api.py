@@ -0,0 +1,224 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+
+from flask import Blueprint, Response, abort, current_app, request
+from werkzeug.exceptions import HTTPException
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import etags
+from forms import VenueForm, ArtistForm, validate_many
+from models import Venue, Artist, Show
+from pagination import KeysetPage
+from routing import read_only
+from queries import (
+    venues_page, artists_page, shows_page, venue_detail, artist_detail, search_query,
+    listing_filters, facets, show_filters
+)
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+if orjson is not None:
+    def dumps(data):
+        # bytes, with datetimes encoded natively
+        return orjson.dumps(data, default=_json_default)
+else:
+    def dumps(data):
+        return json.dumps(data, default=_json_default, separators=(',', ':'))
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+class Serializer:
+    """Projects rows (attribute access) or dicts onto a fixed set of fields.
+
+    `?fields=a,b` narrows the output to a subset of `fields`. The getter for
+    each distinct selection is built once and reused, so serializing a row is
+    one C-level attrgetter/itemgetter call plus a zip.
+    """
+
+    def __init__(self, fields, nested=None):
+        self.fields = tuple(fields)
+        # field -> Serializer for lists of rows (past_shows, upcoming_shows)
+        self.nested = nested or {}
+
+    def selection(self):
+        # the fields asked for with ?fields=, in the order of self.fields
+        raw = request.args.get('fields')
+        if not raw:
+            return self.fields
+        wanted = {field.strip() for field in raw.split(',') if field.strip()}
+        unknown = wanted.difference(self.fields)
+        if unknown:
+            abort(400, description='unknown fields: %s' % ', '.join(sorted(unknown)))
+        return tuple(field for field in self.fields if field in wanted)
+
+    @lru_cache(maxsize=64)
+    def projection(self, fields, mapping):
+        getter = (itemgetter if mapping else attrgetter)(*fields)
+        nested = [(field, self.nested[field]) for field in fields if field in self.nested]
+
+        if len(fields) == 1:
+            single = getter
+            getter = lambda obj: (single(obj),)
+
+        def project(obj):
+            data = dict(zip(fields, getter(obj)))
+            for field, serializer in nested:
+                data[field] = serializer.many(data[field])
+            return data
+        return project
+
+    def one(self, obj, fields=None):
+        return self.projection(fields or self.fields, isinstance(obj, dict))(obj)
+
+    def many(self, objs, fields=None):
+        objs = list(objs)
+        if not objs:
+            return []
+        project = self.projection(fields or self.fields, isinstance(objs[0], dict))
+        return [project(obj) for obj in objs]
+
+
+VENUE_SHOW = Serializer(['artist_id', 'artist_name', 'artist_image_link', 'start_time'])
+ARTIST_SHOW = Serializer(['venue_id', 'venue_name', 'venue_image_link', 'start_time'])
+SHOW_FIELDS = ['past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count']
+
+VENUE_LIST = Serializer(['id', 'name', 'city', 'state', 'num_upcoming_shows'])
+ARTIST_LIST = Serializer(['id', 'name'])
+SHOW_LIST = Serializer(['venue_id', 'venue_name', 'artist_id', 'artist_name',
+                        'artist_image_link', 'start_time'])
+SEARCH_RESULT = Serializer(['id', 'name', 'num_upcoming_shows'])
+
+VENUE = Serializer([
+    'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website', 'facebook_link',
+    'seeking_talent', 'seeking_description', 'image_link', *SHOW_FIELDS
+], nested={'past_shows': VENUE_SHOW, 'upcoming_shows': VENUE_SHOW})
+ARTIST = Serializer([
+    'id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'facebook_link',
+    'seeking_venue', 'seeking_description', 'image_link', *SHOW_FIELDS
+], nested={'past_shows': ARTIST_SHOW, 'upcoming_shows': ARTIST_SHOW})
+
+
+def listing(serializer, page, rows, counts=None):
+    data = {
+        'data': serializer.many(rows, serializer.selection()),
+        'next': page.next_url,
+        'prev': page.prev_url,
+    }
+    if counts is not None:
+        data['facets'] = counts
+    return json_response(data)
+
+
+def filtered_listing(serializer, model, columns, load):
+    # ?genre= / ?state= listings; the first page also carries the facet counts
+    page = KeysetPage.from_request(columns)
+    conditions = listing_filters(model)
+    rows = load(page, conditions)
+    counts = facets(model, conditions) if page.after is None and page.before is None else None
+    return listing(serializer, page, rows, counts)
+
+
+def detail(serializer, load, id):
+    fields = serializer.selection()
+    # the show queries only run when a show field was asked for
+    data = load(id, with_shows=any(field in SHOW_FIELDS for field in fields))
+    return json_response(serializer.one(data, fields))
+
+
+def search(serializer, model):
+    fields = serializer.selection()
+    data = search_query(model, request.args.get('q', ''))
+    return json_response({'count': len(data), 'data': serializer.many(data, fields)})
+
+
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return json_response({'error': error.name, 'description': error.description}, error.code)
+
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.route('/venues')
+@read_only
+@etags.conditional(etags.venues_state)
+def venues():
+    return filtered_listing(VENUE_LIST, Venue, [Venue.state, Venue.city, Venue.name, Venue.id], venues_page)
+
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+@etags.conditional(etags.venue_state)
+def venue(venue_id):
+    return detail(VENUE, venue_detail, venue_id)
+
+
+@api.route('/artists')
+@read_only
+@etags.conditional(etags.artists_state)
+def artists():
+    return filtered_listing(ARTIST_LIST, Artist, [Artist.name, Artist.id], artists_page)
+
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+@etags.conditional(etags.artist_state)
+def artist(artist_id):
+    return detail(ARTIST, artist_detail, artist_id)
+
+
+@api.route('/shows')
+@read_only
+@etags.conditional(etags.shows_state)
+def shows():
+    page = KeysetPage.from_request([Show.start_time, Show.id])
+    return listing(SHOW_LIST, page, shows_page(page, show_filters()))
+
+
+@api.route('/search/venues')
+@read_only
+def search_venues():
+    return search(SEARCH_RESULT, Venue)
+
+
+@api.route('/search/artists')
+@read_only
+def search_artists():
+    return search(SEARCH_RESULT, Artist)
+
+
+@api.route('/validate/<any(venues, artists):kind>', methods=['POST'])
+def validate(kind):
+    # checks a JSON array of venue / artist payloads against the create forms
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        abort(400, description='expected a JSON array of objects')
+    if len(rows) > current_app.config['VALIDATE_BATCH_LIMIT']:
+        abort(413, description='at most %d payloads per request' % current_app.config['VALIDATE_BATCH_LIMIT'])
+
+    form_class = VenueForm if kind == 'venues' else ArtistForm
+    errors = [{'index': index, 'errors': row_errors}
+              for index, (_, row_errors) in enumerate(validate_many(form_class, rows)) if row_errors]
+    return json_response({'valid': len(rows) - len(errors), 'invalid': len(errors), 'errors': errors})
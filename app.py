@@ -2,9 +2,9 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
+import os
 import dateutil.parser
-import babel
+import babel.dates
 from flask import (
   Flask, 
   render_template, 
@@ -12,20 +12,42 @@ from flask import (
   Response, 
   flash, 
   redirect, 
-  url_for
+  url_for,
+  stream_with_context,
+  abort,
+  make_response,
+  session
 )
 from flask_moment import Moment
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
 
+import config
+
 # importing models
-from models import db, Venue, Artist, Show
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION
+from pagination import KeysetPage
+from cache import PageCache
+from feeds import FeedCache
+from recent import RecentItems
+import etags
+from commands import fyyur_cli
+from profiling import Profiler, configure_logging
+from exporter import stream_export, FORMATS as EXPORT_FORMATS
+from queries import (
+  venues_page, artists_page, shows_page, venue_detail, artist_detail, search_query,
+  listing_filters, facets, show_filters
+)
+from api import api, json_response
+from aio import AsyncDatabase
+from routing import ReplicaRouter, read_only
+from stats import ShowStats
+from scheduling import conflicts, is_conflict, availability, requested_window
+from sqlalchemy.exc import IntegrityError
 
-from datetime import datetime
-from sqlalchemy import desc
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import attrgetter
 
 import collections
 collections.Callable = collections.abc.Callable
@@ -36,13 +58,42 @@ collections.Callable = collections.abc.Callable
 
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object('config')
+# FYYUR_ENV picks the profile: development (default), production or benchmark
+app.config.from_object(config.load())
+if not app.config['SECRET_KEY']:
+  raise RuntimeError('set SECRET_KEY in the environment for the %s profile' % os.environ.get('FYYUR_ENV'))
 
 # Initialization of SQLALchemy from models.py
 db.init_app(app)
 
 migrate = Migrate(app, db)
 
+# views marked @read_only read from the replicas in SQLALCHEMY_BINDS
+replicas = ReplicaRouter(db, app)
+
+# venue_stats / artist_stats refreshed in every commit that changes shows
+show_stats = ShowStats(app)
+
+# Rendered listing pages, dropped whenever venues, artists or shows change
+cache = PageCache(app)
+# iCalendar feed bodies, dropped per venue / artist when their shows change
+feeds = FeedCache(app)
+
+# home page lists, updated by the commits that create venues, artists and shows
+recent = RecentItems(app)
+
+# flask fyyur seed / bench
+app.cli.add_command(fyyur_cli)
+
+# Server-Timing headers, request log lines and /_debug/profile when PROFILING_ENABLED
+profiler = Profiler(app)
+
+# asyncpg engine for the detail pages when ASYNC_ENABLED
+async_db = AsyncDatabase(app)
+
+# JSON API at /api/v1
+app.register_blueprint(api)
+
 
 # TODO: connect to a local postgresql database
 
@@ -50,43 +101,61 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
+# The locale and the two named patterns are resolved once at import time;
+# formatting a show is then a single DateTimePattern.apply() call.
+DATETIME_LOCALE = babel.Locale.parse('en')
+DATETIME_PATTERNS = {
+  'full': babel.dates.parse_pattern("EEEE MMMM, d, y 'at' h:mma"),
+  'medium': babel.dates.parse_pattern("EE MM, dd, y h:mma"),
+}
+
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+  # views pass datetime objects straight through; strings are only parsed
+  # when they come from elsewhere, ISO 8601 first and dateutil as fallback
+  if isinstance(value, str):
+    try:
+      value = datetime.fromisoformat(value)
+    except ValueError:
+      value = dateutil.parser.parse(value)
+  pattern = DATETIME_PATTERNS.get(format) or babel.dates.parse_pattern(format)
+  return pattern.apply(value, DATETIME_LOCALE)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+def genre_label(name):
+  # genres are stored by enum name (HipHop), shown by value (Hip-Hop)
+  return Genre[name].value if name in Genre.__members__ else name
+
+app.jinja_env.filters['genre_label'] = genre_label
+
+def facet_url(name, value):
+  # the current listing with `value` added to / removed from ?<name>=, from its first page
+  args = request.args.to_dict(flat=False)
+  args.pop('after', None)
+  args.pop('before', None)
+  values = args.get(name, [])
+  args[name] = [v for v in values if v != value] if value in values else values + [value]
+  return url_for(request.endpoint, **args)
+
+app.jinja_env.globals['facet_url'] = facet_url
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 @app.route('/')
+@read_only
 def index():
-  # Query for venues and artists then arrange them in descending order of their id values, since the id increments,
-  # meaning the highest value indicates the latest record/
-  # The query returns 10 most latest records
-  
-  venues = Venue.query.order_by(desc(Venue.id)).limit(10).all()
-  latestVenues = []
-  for venue in venues:
-        latestVenues.append({
-          'name': venue.name, 
-          'id': venue.id            
-        })
-  
-  artists = Artist.query.order_by(desc(Artist.id)).limit(10).all()                
-  latestArtists = []
-  for artist in artists:
-        latestArtists.append({
-          'id': artist.id,
-          'name': artist.name
-        })
-      
-  return render_template('pages/home.html', artists = latestArtists, venues = latestVenues)
+  # The latest venues, artists and shows and the trending venues come from
+  # the RecentItems buffers, kept up to date by the commits that create them,
+  # so the page is rendered without a query.
+  response = make_response(render_template('pages/home.html', **recent.snapshot()))
+  # pages carrying a flash message are one-offs
+  if not session.get('_flashes'):
+    response.add_etag()
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+  return response
 
 
 
@@ -94,53 +163,43 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
+@etags.conditional(etags.venues_state)
+@cache.cached
 def venues():
   # TODO: replace with real venues data.
   #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  venues = Venue.query.all()
+  # one ordered pass: venues come back sorted by area, so each city/state
+  # group is a contiguous run that groupby can emit as it streams.
+  # The page is cut with a keyset on the sort key.
+  # ?genre= / ?state= narrow the listing; the facet counts are only
+  # computed for the first page.
+  page = KeysetPage.from_request([Venue.state, Venue.city, Venue.name, Venue.id])
+  conditions = listing_filters(Venue)
+  venues = venues_page(page, conditions)
+  counts = facets(Venue, conditions) if page.after is None and page.before is None else None
+
   data = []
-  
-  locations = Venue.query.distinct(Venue.city, Venue.state).all()
-  
-  for location in locations:
+  for (state, city), area_venues in groupby(venues, key=attrgetter('state', 'city')):
         data.append({
-          'city': location.city,
-          'state': location.state,
-          'venues': [{
-          'id':venue.id,
-          'name': venue.name,
-          'num_upcoming_shows': len([show for show in venue.shows if show.start_time > datetime.now()])
-          }
-        for venue in venues if
-        venue.city == location.city and venue.state == location.state
-        ]
+          'city': city,
+          'state': state,
+          'venues': list(area_venues)
         })
 
-  return render_template('pages/venues.html', areas=data ); 
+  return render_template('pages/venues.html', areas=data, page=page, facets=counts,
+                         selected=request.args.to_dict(flat=False))
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
   # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
   search_term = request.form['search_term']
   
-  venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
-  
-  data =[]
-  for venue in venues:
-        #takes count of upcoming shows in the venue
-        count_shows = 0
-        for shows in venue.shows:
-              if shows.start_time > datetime.now():
-                    count_shows += 1
-                    
-        data.append({
-          'id': venue.id,
-          'name': venue.name,
-          'num_upcoming_shows': count_shows
-        })
-   
+  # (id, name, num_upcoming_shows) rows, best matches first
+  data = search_query(Venue, search_term)   
   response = {
     'count':len(data),
     'data': data
@@ -150,45 +209,30 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@read_only
+@etags.conditional(etags.venue_state)
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.get_or_404(venue_id)
-  
-  upcoming_shows = []
-  past_shows = []
- 
-  for this_show in venue.shows:
-        show = {}
-        show['artist_id'] = this_show.artist_id
-        show['artist_name'] = this_show.artist.name
-        show['artist_image_link'] = this_show.artist.image_link
-        show['start_time'] = str(this_show.start_time)
-        if this_show.start_time <= datetime.now():
-              past_shows.append(show)
-        else:
-              upcoming_shows.append(show)
- 
-  data = {
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres,
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website_link,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "image_link": venue.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows),
-  }
+  data = venue_detail(venue_id)
   
   return render_template('pages/show_venue.html', venue=data)
 
+@app.route('/venues/<int:venue_id>/shows.ics')
+@read_only
+def venue_calendar(venue_id):
+  # iCalendar feed of the venue's shows, streamed on a miss
+  return feeds.response('venue', venue_id)
+
+@app.route('/venues/<int:venue_id>/availability')
+def venue_availability(venue_id):
+  # booked slots and free gaps of the venue between ?from= and ?to=, as JSON;
+  # read from the primary, bookers act on the answer straight away
+  if db.session.query(Venue.id).filter(Venue.id == venue_id).first() is None:
+    abort(404)
+  start, end = requested_window()
+  return json_response(availability(Show.venue_id, venue_id, start, end))
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -296,88 +340,46 @@ def delete_artist(artist_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_only
+@etags.conditional(etags.artists_state)
+@cache.cached
 def artists():
   # TODO: replace with real data returned from querying the database
-  artists = Artist.query.order_by(Artist.name).all()
-  
-  data = []
-  for a in artists:
-        data.append({
-          "id": a.id,
-          "name": a.name
-        })
-   
-  return render_template('pages/artists.html', artists=data)
+  page = KeysetPage.from_request([Artist.name, Artist.id])
+  conditions = listing_filters(Artist)
+  data = artists_page(page, conditions)
+  counts = facets(Artist, conditions) if page.after is None and page.before is None else None
+
+  return render_template('pages/artists.html', artists=data, page=page, facets=counts,
+                         selected=request.args.to_dict(flat=False))
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   search_term = request.form['search_term']
-  artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
-  
-  data =[]
-  
-  for artist in artists:
-        
-        # take count of total upcoming show the artist has
-        count_shows = 0
-        for shows in artist.shows:
-              if shows.start_time > datetime.now():
-                    count_shows += 1
-                    
-        data.append({
-          'id': artist.id,
-          'name': artist.name,
-          'num_upcoming_shows': count_shows
-        })
-   
+  # (id, name, num_upcoming_shows) rows, best matches first
+  data = search_query(Artist, search_term)   
   response = {
     'count':len(data),
     'data': data
   }
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
+@app.route('/artists/<int:artist_id>/shows.ics')
+@read_only
+def artist_calendar(artist_id):
+  return feeds.response('artist', artist_id)
+
 @app.route('/artists/<int:artist_id>')
+@read_only
+@etags.conditional(etags.artist_state)
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # TODO: replace with real artist data from the artist table, using artist_id
-  artist = Artist.query.get_or_404(artist_id)
-  
-  upcoming_shows = []
-  past_shows = []
-  
-  for this_show in artist.shows:
-        show = {
-          'venue_id': this_show.venue_id,
-          'venue_name': this_show.venue.name,
-          'venue_image_link': this_show.venue.image_link,
-          'start_time': str(this_show.start_time)
-        }
-          
-        if this_show.start_time <= datetime.now():
-            past_shows.append(show)
-        else:
-            upcoming_shows.append(show)
-        
-  data = {
-    "id": artist.id,
-    "name": artist.name,
-    "genres": artist.genres,
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "website": artist.website_link,
-    "facebook_link": artist.facebook_link,
-    "seeking_venue": artist.seeking_venue,
-    "seeking_description": artist.seeking_description,
-    "image_link": artist.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows),
-  }
+  data = artist_detail(artist_id)
   
   return render_template('pages/show_artist.html', artist=data)
 
@@ -580,25 +582,19 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_only
+@etags.conditional(etags.shows_state)
+@cache.cached
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data.
   
-  data = []
-  shows = Show.query.all()
-  
-  for show in shows:
-        detail ={}
-        detail['venue_id'] = show.venue_id
-        detail['venue_name'] = show.venue.name
-        detail['artist_id'] = show.artist_id
-        detail['artist_name'] = show.artist.name
-        detail['artist_image_link'] = show.artist.image_link
-        detail['start_time'] = str(show.start_time)
-        
-        data.append(detail)
+  # ?from=&to=&city=&genre= narrow the listing to a date range, a city and genres
+  page = KeysetPage.from_request([Show.start_time, Show.id])
+  data = shows_page(page, show_filters())
   
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data, page=page, genres=Genre.choices(),
+                         selected=request.args.to_dict(flat=False))
 
 @app.route('/shows/create')
 def create_shows():
@@ -609,24 +605,62 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
-  form = ShowForm(request.form)
+  # no form of this app posts a CSRF token (yet), so only the fields are checked
+  form = ShowForm(request.form, meta={'csrf': False})
+  if not form.validate():
+    return render_template('forms/new_show.html', form=form), 400
+
+  venue_id, artist_id, start_time = form.venue_id.data, form.artist_id.data, form.start_time.data
+  duration = timedelta(minutes=form.duration.data) if form.duration.data else DEFAULT_SHOW_DURATION
   error = False
 
   # TODO: insert form data as a new Show record in the db, instead
+  # Double bookings are answered from the GiST indexes of the no-overlap
+  # constraints before inserting; the constraints themselves catch the
+  # bookings that race this check.
+  booked, conflicted = [], False
   try:
-    show = Show(
-      artist_id = form.artist_id.data,
-      venue_id = form.venue_id.data,
-      start_time = form.start_time.data
-    )
-    
-    db.session.add(show)
-    db.session.commit()
+    booked = conflicts(venue_id, artist_id, start_time, duration)
+    if not booked:
+      show = Show(
+        artist_id = artist_id,
+        venue_id = venue_id,
+        start_time = start_time,
+        duration = duration
+      )
+
+      db.session.add(show)
+      db.session.commit()
+  except IntegrityError as e:
+    db.session.rollback()
+    if not is_conflict(e):
+      error = True
+    else:
+      conflicted = True
   except:
     db.session.rollback()
     error = True
   finally:
     db.session.close()
+
+  if conflicted:
+    # the booking that won the race, for the message; it is only a nicety,
+    # so a failure here still answers 409
+    try:
+      booked = conflicts(venue_id, artist_id, start_time, duration)
+    except:
+      db.session.rollback()
+    finally:
+      db.session.close()
+
+  if booked or conflicted:
+    for other in booked:
+      flash('Show could not be listed: the %s is already booked from %s to %s (show %d).' % (
+        'venue' if other.venue_id == venue_id else 'artist',
+        format_datetime(other.start_time), format_datetime(other.start_time + other.duration), other.id))
+    if not booked:
+      flash('Show could not be listed: the venue or the artist is already booked at that time.')
+    return render_template('forms/new_show.html', form=form), 409
     
   # TODO: on unsuccessful db insert, flash an error instead.
   # e.g., flash('An error occurred. Show could not be listed.')
@@ -643,6 +677,18 @@ def create_show_submission():
 
   
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<any(venues, artists, shows):kind>.<any(ndjson, csv):fmt>')
+def export(kind, fmt):
+  # streamed from a server-side cursor, the body is never built in memory
+  return Response(
+    stream_with_context(stream_export(kind, fmt)),
+    mimetype=EXPORT_FORMATS[fmt],
+    headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -652,20 +698,15 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# JSON log lines in error.log (LOG_FILE) outside debug mode
+configure_logging(app)
 
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
+# Development server only; in production run
+#   FYYUR_ENV=production gunicorn -c gunicorn.conf.py app:app
 # Default port:
 if __name__ == '__main__':
     app.run()
@@ -0,0 +1,599 @@
+import contextvars
+import gc
+import json
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+from flask import current_app
+from sqlalchemy import event, insert, select
+from sqlalchemy.engine import Engine
+
+from enums import Genre, State
+from forms import VenueForm, ArtistForm, to_formdata, validate_many
+from models import db, Venue, Artist, Show
+from stats import refresh
+
+
+#----------------------------------------------------------------------------#
+# Seeding.
+#----------------------------------------------------------------------------#
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Chicago', 'IL'), ('Austin', 'TX'), ('Seattle', 'WA'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Denver', 'CO'), ('Portland', 'OR'),
+]
+
+WORDS = [
+    'Blue', 'Wild', 'Sax', 'Musical', 'Hop', 'Park', 'Square', 'Live', 'Coffee',
+    'Petals', 'Guns', 'Electric', 'Velvet', 'Echo', 'Moon', 'River', 'Static',
+    'Golden', 'Hollow', 'Neon', 'Band', 'Hall', 'Room', 'Club', 'Garden',
+]
+
+
+def _name(rng, words=3):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _place(rng, cities):
+    if rng.random() < 0.8:
+        return rng.choice(CITIES)
+    # a long tail of small towns so /venues has many areas
+    return ('Town %d' % rng.randrange(cities), rng.choice(list(State)).value)
+
+
+def _genres(rng):
+    return rng.sample([genre.name for genre in Genre], rng.randint(1, 3))
+
+
+def fake_venue(rng, i, cities=500):
+    city, state = _place(rng, cities)
+    return {
+        'name': 'The %s %s' % (_name(rng, 2), rng.choice(['Hall', 'Room', 'Club', 'Garden'])),
+        'city': city, 'state': state,
+        'address': '%d %s St' % (rng.randint(1, 9999), rng.choice(WORDS)),
+        'phone': '%03d-%03d-%04d' % (rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999)),
+        'genres': _genres(rng), 'seeking_talent': rng.random() < 0.5,
+        'seeking_description': 'We are looking for %s acts.' % _name(rng, 1),
+        'image_link': 'https://example.com/venue/%d.jpg' % i,
+        'facebook_link': 'https://www.facebook.com/venue%d' % i,
+        'website_link': 'https://venue%d.example.com' % i,
+    }
+
+
+def fake_artist(rng, i, cities=500):
+    city, state = _place(rng, cities)
+    return {
+        'name': _name(rng), 'city': city, 'state': state,
+        'phone': '%03d-%03d-%04d' % (rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999)),
+        'genres': _genres(rng), 'seeking_venue': rng.random() < 0.5,
+        'seeking_description': 'Looking for shows in %s.' % city,
+        'image_link': 'https://example.com/artist/%d.jpg' % i,
+        'facebook_link': 'https://www.facebook.com/artist%d' % i,
+        'website_link': 'https://artist%d.example.com' % i,
+    }
+
+
+def seed(venues, artists, shows, cities=500, batch_size=5000, truncate=False, seed_value=0, echo=print):
+    """Fills the configured database with generated venues, artists and shows.
+
+    Rows go in through batched executemany inserts. The same arguments always
+    produce the same data, so two runs of the benchmark are comparable.
+    """
+    rng = random.Random(seed_value)
+    if truncate:
+        db.session.execute(db.text('TRUNCATE show, venue, artist RESTART IDENTITY CASCADE'))
+
+    def insert_batches(table, total, make_row):
+        for start in range(0, total, batch_size):
+            rows = [make_row(i) for i in range(start, min(start + batch_size, total))]
+            db.session.execute(insert(table), rows)
+            db.session.commit()
+        echo('%s: %d rows' % (table.name, total))
+
+    insert_batches(Venue.__table__, venues, lambda i: fake_venue(rng, i, cities))
+    insert_batches(Artist.__table__, artists, lambda i: fake_artist(rng, i, cities))
+
+    venue_ids = [row.id for row in db.session.query(Venue.id)]
+    artist_ids = [row.id for row in db.session.query(Artist.id)]
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    # Shows take the default two hours and start on even hours, one year
+    # back to one year ahead. A slot already taken by the drawn venue or
+    # artist is drawn again, so that the no-overlap constraints hold.
+    slots = 24 * 365
+    venue_slots, artist_slots = set(), set()
+
+    def show_row(i):
+        for _ in range(100):
+            venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+            slot = rng.randrange(slots)
+            if venue_id * slots + slot not in venue_slots and artist_id * slots + slot not in artist_slots:
+                break
+        else:
+            raise ValueError('too many shows for %d venues and %d artists' % (len(venue_ids), len(artist_ids)))
+        venue_slots.add(venue_id * slots + slot)
+        artist_slots.add(artist_id * slots + slot)
+        return {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': now + timedelta(hours=2 * slot - slots),
+        }
+
+    if shows and venue_ids and artist_ids:
+        insert_batches(Show.__table__, shows, show_row)
+
+    for model in (Venue, Artist):
+        refresh(model)
+    db.session.commit()
+    echo('venue_stats, artist_stats: refreshed')
+    # Core inserts skip the ORM events the caches and home page lists listen to
+    for name in ('page_cache', 'feed_cache', 'recent_items'):
+        cache = current_app.extensions.get(name)
+        if cache is not None:
+            cache.clear()
+
+
+#----------------------------------------------------------------------------#
+# Routes.
+#----------------------------------------------------------------------------#
+
+def _form(**fields):
+    return fields
+
+
+def route_table():
+    """Every route of app.py as (name, method, make_request) entries.
+
+    make_request() returns (url, data) for one request, picking ids from the
+    seeded data; data is a dict of form fields or a JSON string. Write routes create their own rows so that repeated runs
+    never run out of things to edit or delete.
+    """
+    rng = random.Random(1)
+    venue_ids = [row.id for row in db.session.query(Venue.id).limit(1000)]
+    artist_ids = [row.id for row in db.session.query(Artist.id).limit(1000)]
+    # whole seeded names: as selective as a real search, unlike single words
+    artist_names = [row.name for row in db.session.query(Artist.name).limit(1000)]
+    db.session.remove()
+
+    venue_form = _form(name='Bench Venue', city='San Francisco', state='CA', address='1 Main St',
+                       phone='415-000-0000', genres='Jazz', facebook_link='https://www.facebook.com/bench',
+                       image_link='', website_link='', seeking_description='')
+    artist_form = _form(name='Bench Artist', city='San Francisco', state='CA', phone='415-000-0000',
+                        genres='Jazz', facebook_link='https://www.facebook.com/bench',
+                        image_link='', website_link='', seeking_description='')
+
+    def throwaway(model, **values):
+        row = db.session.execute(insert(model.__table__).returning(model.id), [values]).scalar()
+        db.session.commit()
+        db.session.remove()
+        return row
+
+    def get(url):
+        return lambda: (url() if callable(url) else url, None)
+
+    def post(url, data):
+        return lambda: (url() if callable(url) else url, data() if callable(data) else data)
+
+    def post_json(url, payload):
+        return lambda: (url, json.dumps(payload() if callable(payload) else payload))
+    return [
+        ('index', 'GET', get('/')),
+        ('venues', 'GET', get('/venues')),
+        ('artists', 'GET', get('/artists')),
+        ('venues_filtered', 'GET', get(lambda: '/venues?genre=%s&state=%s' % (
+            rng.choice(list(Genre.__members__)), rng.choice(list(State.__members__))))),
+        ('artists_filtered', 'GET', get(lambda: '/artists?genre=%s&genre=%s' % tuple(
+            rng.sample(list(Genre.__members__), 2)))),
+        ('shows', 'GET', get('/shows')),
+        ('shows_filtered', 'GET', get(lambda: '/shows?from=%s&to=%s&city=%s' % (
+            datetime.now().date(), datetime.now().date() + timedelta(days=30),
+            urllib.parse.quote(rng.choice(CITIES)[0])))),
+        ('venue_availability', 'GET', get(lambda: '/venues/%d/availability?from=%s&to=%s' % (
+            rng.choice(venue_ids), datetime.now().date(), datetime.now().date() + timedelta(days=30)))),
+        ('venue_calendar', 'GET', get(lambda: '/venues/%d/shows.ics' % rng.choice(venue_ids))),
+        ('artist_calendar', 'GET', get(lambda: '/artists/%d/shows.ics' % rng.choice(artist_ids))),
+        ('show_venue', 'GET', get(lambda: '/venues/%d' % rng.choice(venue_ids))),
+        ('show_artist', 'GET', get(lambda: '/artists/%d' % rng.choice(artist_ids))),
+        ('search_venues', 'POST', post('/venues/search', lambda: {'search_term': rng.choice(WORDS)})),
+        ('search_artists', 'POST', post('/artists/search', lambda: {'search_term': rng.choice(WORDS)})),
+        ('search_artists_by_name', 'POST', post('/artists/search', lambda: {'search_term': rng.choice(artist_names)})),
+        ('create_venue_form', 'GET', get('/venues/create')),
+        ('create_artist_form', 'GET', get('/artists/create')),
+        ('create_shows', 'GET', get('/shows/create')),
+        ('edit_venue', 'GET', get(lambda: '/venues/%d/edit' % rng.choice(venue_ids))),
+        ('edit_artist', 'GET', get(lambda: '/artists/%d/edit' % rng.choice(artist_ids))),
+        ('create_venue_submission', 'POST', post('/venues/create', venue_form)),
+        ('create_artist_submission', 'POST', post('/artists/create', artist_form)),
+        ('create_show_submission', 'POST', post('/shows/create', lambda: {
+            'venue_id': rng.choice(venue_ids), 'artist_id': rng.choice(artist_ids),
+            'start_time': (datetime.now() + timedelta(days=rng.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S')})),
+        ('edit_venue_submission', 'POST', post(
+            lambda: '/venues/%d/edit' % throwaway(Venue, name='Bench Venue', city='Bench', state='CA'),
+            venue_form)),
+        ('edit_artist_submission', 'POST', post(
+            lambda: '/artists/%d/edit' % throwaway(Artist, name='Bench Artist', city='Bench', state='CA'),
+            artist_form)),
+        ('delete_venue', 'POST', post(
+            lambda: '/venues/%d/delete' % throwaway(Venue, name='Bench Venue', city='Bench', state='CA'), {})),
+        ('delete_artist', 'POST', post(
+            lambda: '/artists/%d/delete' % throwaway(Artist, name='Bench Artist', city='Bench', state='CA'), {})),
+        ('export_venues', 'GET', get('/export/venues.ndjson')),
+        ('export_shows', 'GET', get('/export/shows.csv')),
+        ('api.venues', 'GET', get('/api/v1/venues')),
+        ('api.artists', 'GET', get('/api/v1/artists')),
+        ('api.shows', 'GET', get('/api/v1/shows')),
+        ('api.venue', 'GET', get(lambda: '/api/v1/venues/%d' % rng.choice(venue_ids))),
+        ('api.artist', 'GET', get(lambda: '/api/v1/artists/%d?fields=id,name,upcoming_shows'
+                                  % rng.choice(artist_ids))),
+        ('api.search_venues', 'GET', get(lambda: '/api/v1/search/venues?q=' + rng.choice(WORDS))),
+        ('api.search_artists', 'GET', get(lambda: '/api/v1/search/artists?q=' + rng.choice(WORDS))),
+        ('api.search_artists_by_name', 'GET', get(
+            lambda: '/api/v1/search/artists?q=' + urllib.parse.quote(rng.choice(artist_names)))),
+        ('api.validate', 'POST', post_json('/api/v1/validate/venues', lambda: [
+            fake_venue(rng, i) for i in range(100)])),
+    ]
+
+
+#----------------------------------------------------------------------------#
+# Measurement.
+#----------------------------------------------------------------------------#
+
+class QueryCounter:
+    # Counts statements, and the rows they returned or changed, on every
+    # engine while used as a context manager, which removes its listeners on
+    # exit. The counts live in a context variable, so each thread has its own
+    # and statements run on the async database loop on behalf of a request
+    # are still counted for it. Rows read through server-side cursors (the
+    # exports) are not counted.
+
+    def __init__(self):
+        self.current = contextvars.ContextVar('bench_query_count', default=None)
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        count = self.current.get()
+        if count is not None:
+            count[0] += 1
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        count = self.current.get()
+        if count is not None:
+            rows = cursor.rowcount
+            if rows < 0:
+                # asyncpg's adapted cursor only reports rowcount for DML
+                rows = len(getattr(cursor, '_rows', None) or ())
+            count[1] += rows
+
+    def start(self):
+        self.current.set([0, 0])
+
+    def stop(self):
+        # (statements, rows)
+        count = self.current.get()
+        self.current.set(None)
+        return tuple(count)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def rss_mb():
+    # current resident set size, from /proc (None where there is none)
+    try:
+        with open('/proc/self/statm') as f:
+            resident = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident * resource.getpagesize() / (1024 * 1024)
+
+
+def summarize(name, latencies, queries=None, errors=0, rows=None, rss_delta_mb=None):
+    latencies = sorted(latencies)
+    return {
+        'route': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries': max(queries) if queries else None,
+        'rows': max(rows) if rows else None,
+        'rss_delta_mb': round(rss_delta_mb, 1) if rss_delta_mb is not None else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run_client(app, routes, requests, warmup=2, only=None, workers=1):
+    """Drives each route through the Flask test client.
+
+    Reports latency percentiles, throughput, the largest number of SQL
+    statements and of database rows a single request issued or read, how
+    much the process RSS grew while the route ran (warmup included), and
+    the process peak RSS once the route has run. Only the RSS growth is a
+    property of the route: the peak depends on the routes run before it.
+    With workers > 1 the requests of a route are issued from that many
+    threads at once.
+    """
+    results = []
+    with QueryCounter() as counter:
+        for name, method, make_request in routes:
+            if only and name not in only:
+                continue
+
+            def fire(job):
+                url, data = job
+                counter.start()
+                started = time.perf_counter()
+                response = app.test_client().open(url, method=method, data=data,
+                                                  content_type='application/json' if isinstance(data, str) else None)
+                # streamed bodies (feeds, exports) are only produced when read
+                response.get_data()
+                response.close()
+                elapsed = time.perf_counter() - started
+                queries, rows = counter.stop()
+                return elapsed, queries, rows, response.status_code >= 400
+
+            # garbage left over from earlier routes is not counted against this one
+            gc.collect()
+            rss_before = rss_mb()
+            for _ in range(warmup):
+                fire(make_request())
+            jobs = [make_request() for _ in range(requests)]
+
+            started = time.perf_counter()
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    outcomes = list(pool.map(fire, jobs))
+            else:
+                outcomes = [fire(job) for job in jobs]
+            wall = time.perf_counter() - started
+            gc.collect()
+            rss_after = rss_mb()
+
+            result = summarize(name, [latency for latency, _, _, _ in outcomes],
+                               [queries for _, queries, _, _ in outcomes],
+                               errors=sum(failed for _, _, _, failed in outcomes),
+                               rows=[rows for _, _, rows, _ in outcomes],
+                               rss_delta_mb=rss_after - rss_before if rss_before is not None else None)
+            result['requests_per_s'] = round(len(jobs) / wall, 1) if wall else None
+            results.append(result)
+    return results
+
+
+def run_http(base_url, routes, requests, workers, only=None):
+    """Replays the same routes against a running server from `workers` threads."""
+    results = []
+    for name, method, make_request in routes:
+        if only and name not in only:
+            continue
+        jobs = [make_request() for _ in range(requests)]
+
+        def fire(job):
+            url, data = job
+            headers = {}
+            if isinstance(data, str):
+                body, headers['Content-Type'] = data.encode(), 'application/json'
+            else:
+                body = urllib.parse.urlencode(data).encode() if data is not None else None
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(
+                        base_url.rstrip('/') + url, data=body, headers=headers, method=method)) as response:
+                    response.read()
+                failed = False
+            except urllib.error.URLError:
+                failed = True
+            return time.perf_counter() - started, failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(fire, jobs))
+        wall = time.perf_counter() - started
+
+        result = summarize(name, [latency for latency, _ in outcomes],
+                           errors=sum(failed for _, failed in outcomes))
+        result['requests_per_s'] = round(len(jobs) / wall, 1) if wall else None
+        results.append(result)
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Form validation.
+#----------------------------------------------------------------------------#
+
+def run_validation(kind, rows, invalid=0.1, seed_value=0):
+    """Validations per second of generated venue or artist payloads, one form
+    per payload (as the create views do) against forms.validate_many.
+
+    A share `invalid` of the payloads carries a bad phone number or state.
+    """
+    rng = random.Random(seed_value)
+    form_class, fake = (VenueForm, fake_venue) if kind == 'venues' else (ArtistForm, fake_artist)
+    payloads = []
+    for i in range(rows):
+        payload = fake(rng, i)
+        if rng.random() < invalid:
+            payload[rng.choice(['phone', 'state'])] = 'XX'
+        payloads.append(payload)
+
+    def per_form():
+        return [form_class(formdata=to_formdata(payload), meta={'csrf': False}).validate()
+                for payload in payloads]
+
+    def batched():
+        return [errors is None for _, errors in validate_many(form_class, payloads)]
+
+    results = []
+    for name, run in (('form per payload', per_form), ('validate_many', batched)):
+        started = time.perf_counter()
+        outcomes = run()
+        elapsed = time.perf_counter() - started
+        results.append({
+            'method': name,
+            'rows': rows,
+            'valid': sum(outcomes),
+            'seconds': round(elapsed, 3),
+            'validations_per_s': round(rows / elapsed) if elapsed else None,
+        })
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Read paths.
+#----------------------------------------------------------------------------#
+
+# the columns each listing renders
+READ_COLUMNS = {
+    'venues': (Venue, ('id', 'name', 'city', 'state')),
+    'artists': (Artist, ('id', 'name')),
+    'shows': (Show, ('id', 'start_time', 'venue_id', 'artist_id')),
+}
+
+
+def _slots_class(names):
+    # a __slots__ record with one attribute per column
+    def __init__(self, *values):
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+    return type('ListingRow', (), {'__slots__': names, '__init__': __init__})
+
+
+def run_read_paths(kind, rows, repeat=3):
+    """Rows per second and memory per row of reading `rows` rows of a listing
+    table four ways: ORM entities copied into dicts (as the listings used to),
+    an ORM column query, plain Core rows (queries.read_rows) and __slots__
+    records built from those rows.
+
+    Memory is what the result retains (tracemalloc, after the read) divided
+    by the row count; the best of `repeat` runs is reported for speed.
+    """
+    from queries import read_rows
+
+    model, names = READ_COLUMNS[kind]
+    columns = [getattr(model, name) for name in names]
+    record = _slots_class(names)
+    getters = [(name, attrgetter(name)) for name in names]
+
+    def entities():
+        return [{name: get(obj) for name, get in getters}
+                for obj in model.query.order_by(model.id).limit(rows).all()]
+
+    def orm_columns():
+        return db.session.query(*columns).order_by(model.id).limit(rows).all()
+
+    def core_rows():
+        return read_rows(select(*columns).order_by(model.id).limit(rows))
+
+    def slots():
+        return [record(*row) for row in read_rows(select(*columns).order_by(model.id).limit(rows))]
+
+    results = []
+    for name, run in (('orm entities', entities), ('orm columns', orm_columns),
+                      ('core rows', core_rows), ('slots records', slots)):
+        best, retained, count = None, None, 0
+        for _ in range(repeat):
+            db.session.remove()
+            gc.collect()
+            tracemalloc.start()
+            started = time.perf_counter()
+            data = run()
+            elapsed = time.perf_counter() - started
+            # still held by the session counts against the ORM paths
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            count = len(data)
+            best = elapsed if best is None else min(best, elapsed)
+            retained = size if retained is None else min(retained, size)
+            del data
+        results.append({
+            'method': name,
+            'rows': count,
+            'seconds': round(best, 3),
+            'rows_per_s': round(count / best) if best else None,
+            'bytes_per_row': round(retained / count) if count else None,
+        })
+    db.session.remove()
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Thresholds.
+#----------------------------------------------------------------------------#
+
+# Metrics compared against the threshold file; lower is better for all of them.
+CHECKED_METRICS = ('p95_ms', 'p99_ms', 'queries', 'rss_delta_mb')
+
+# RSS growth of a route is often 0 and moves in whole allocator arenas, so
+# its threshold gets this much on top of the relative headroom
+RSS_SLACK_MB = 8
+
+
+def _threshold(metric, value, headroom):
+    if metric == 'queries':
+        return value
+    if metric == 'rss_delta_mb':
+        return round(max(value, 0) * headroom + RSS_SLACK_MB, 2)
+    return round(value * headroom, 2)
+
+
+def save_thresholds(path, results, headroom):
+    thresholds = {}
+    for result in results:
+        thresholds[result['route']] = {
+            metric: _threshold(metric, result[metric], headroom)
+            for metric in CHECKED_METRICS if result.get(metric) is not None
+        }
+    with open(path, 'w') as f:
+        json.dump(thresholds, f, indent=2, sort_keys=True)
+
+
+def check_thresholds(path, results):
+    # returns one message per metric above its threshold
+    with open(path) as f:
+        thresholds = json.load(f)
+    failures = []
+    for result in results:
+        for metric, limit in thresholds.get(result['route'], {}).items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                failures.append('%s: %s %s > %s' % (result['route'], metric, value, limit))
+    return failures
+
+
+def format_table(results):
+    columns = ['route', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'rows', 'rss_delta_mb', 'peak_rss_mb']
+    if any('requests_per_s' in result for result in results):
+        columns.append('requests_per_s')
+    rows = [columns] + [[str(result.get(column, '')) for column in columns] for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
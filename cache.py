@@ -0,0 +1,267 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, current_app, g, request, session as flask_session
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class NullBackend:
+    # CACHE_TYPE = 'null': every lookup misses
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUBackend:
+    # In-process, per worker. A worker only sees its own commits, so entries
+    # written by other workers are bounded by CACHE_DEFAULT_TIMEOUT instead.
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisBackend:
+    # Shared by every worker talking to the same Redis-compatible server.
+    # Keys carry a generation number; clear() bumps it, which orphans all
+    # existing entries at once and leaves them to expire on their own.
+
+    def __init__(self, url, prefix):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_TYPE = 'redis' needs the redis package installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, key):
+        generation = self.client.get(self.prefix + ':generation') or b'0'
+        return '%s:%s:%s' % (self.prefix, generation.decode(), key)
+
+    def get(self, key):
+        value = self.client.get(self._key(key))
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(self._key(key), pickle.dumps(value), ex=timeout)
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        self.client.incr(self.prefix + ':generation')
+
+
+def backend_from_config(app, prefix):
+    # the backend named by CACHE_TYPE; Redis keys are namespaced by `prefix`
+    cache_type = app.config.get('CACHE_TYPE', 'null')
+    if cache_type == 'lru':
+        return LRUBackend(app.config.get('CACHE_LRU_ENTRIES', 1024))
+    if cache_type == 'redis':
+        return RedisBackend(app.config['CACHE_REDIS_URL'], prefix)
+    if cache_type != 'null':
+        raise ValueError('unknown CACHE_TYPE %r' % cache_type)
+    return NullBackend()
+
+
+#----------------------------------------------------------------------------#
+# Table generations.
+#----------------------------------------------------------------------------#
+
+class RedisGenerations:
+    # One INCR counter per table, bumped by every commit that touches the
+    # table and shared by every worker. They key the cached validator values
+    # of etags.conditional, and live outside RedisBackend's generation
+    # namespace, so clearing the pages leaves them alone.
+
+    def __init__(self, url, prefix):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_TYPE = 'redis' needs the redis package installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, table):
+        return '%s:table:%s' % (self.prefix, table)
+
+    def get(self, tables):
+        return [int(count or 0) for count in self.client.mget([self._key(table) for table in tables])]
+
+    def bump(self, tables):
+        pipeline = self.client.pipeline()
+        for table in tables:
+            pipeline.incr(self._key(table))
+        pipeline.execute()
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Any change to these models can alter a cached page.
+CACHED_MODELS = (Venue, Artist, Show)
+
+
+class PageCache:
+    """Caches rendered GET responses keyed by endpoint and query arguments.
+
+    Entries are dropped whenever a session commits a flush that touched a
+    Venue, Artist or Show, so cached pages never outlive the data they show.
+    With a Redis cache the same commits bump the generations of the tables
+    they touched, which the validator values of etags.conditional are cached
+    under.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.generations = None
+        self.timeout = 0
+        self.cleared_at = float('-inf')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        prefix = app.config.get('CACHE_KEY_PREFIX', 'fyyur')
+        self.backend = backend_from_config(app, prefix)
+        self.timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        if app.config.get('CACHE_TYPE') == 'redis':
+            self.generations = RedisGenerations(app.config['CACHE_REDIS_URL'], prefix)
+        app.extensions['page_cache'] = self
+
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # a pending flash message belongs to this visitor only
+            if request.method != 'GET' or flask_session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            key = self.key()
+            hit = self.backend.get(key)
+            if hit is not None:
+                body, mimetype = hit
+                return Response(body, mimetype=mimetype)
+
+            response = view(*args, **kwargs)
+            if not isinstance(response, Response):
+                response = Response(response)
+            if response.status_code == 200 and not response.is_streamed and not self.maybe_stale():
+                self.backend.set(key, (response.get_data(), response.mimetype), self.timeout)
+            return response
+        return wrapper
+
+    def key(self):
+        args = sorted(request.args.items(multi=True))
+        return 'view:%s:%s:%r' % (request.endpoint, sorted((request.view_args or {}).items()), args)
+
+    def maybe_stale(self):
+        # a page read from a replica shortly after a clear may predate the
+        # change that caused it, so it is served but not stored
+        return g.get('db_replica') is not None and \
+            time.monotonic() - self.cleared_at < current_app.config.get('REPLICA_MAX_LAG_SECONDS', 0)
+
+    def validator_state(self, key, tables, statement):
+        """The values of a conditional GET's validator `statement`.
+
+        Per-process caches cannot see other workers' commits, so there the
+        statement runs on every request. With Redis the values are cached
+        per generation of `tables`: they are read again after a commit that
+        touches those tables, after CACHE_DEFAULT_TIMEOUT (which bounds
+        writes that bypass the session hooks), or once the upcoming show
+        they include (labelled next_show) has started.
+        """
+        if self.generations is None:
+            return tuple(db.session.execute(statement).one())
+
+        key = 'validator:%s:%r' % (key, self.generations.get(tables))
+        hit = self.backend.get(key)
+        if hit is not None:
+            return hit
+        row = db.session.execute(statement).one()
+        timeout = self.timeout
+        next_show = row._mapping.get('next_show')
+        if next_show is not None:
+            timeout = max(1, min(timeout, int((next_show - datetime.now()).total_seconds())))
+        if not self.maybe_stale():
+            self.backend.set(key, tuple(row), timeout)
+        return tuple(row)
+
+    def clear(self):
+        # after writes that bypass the session hooks (the importer)
+        self._clear({model.__tablename__ for model in CACHED_MODELS})
+
+    def _clear(self, tables):
+        self.cleared_at = time.monotonic()
+        if self.generations is not None:
+            self.generations.bump(tables)
+        self.backend.clear()
+
+    def disable(self):
+        self.backend = NullBackend()
+
+    # invalidation hooks ------------------------------------------------------
+
+    def _after_flush(self, session, flush_context):
+        tables = {obj.__tablename__ for obj in (*session.new, *session.dirty, *session.deleted)
+                  if isinstance(obj, CACHED_MODELS)}
+        if tables:
+            session.info.setdefault('page_cache_tables', set()).update(tables)
+
+    def _after_commit(self, session):
+        tables = session.info.pop('page_cache_tables', None)
+        if tables:
+            self._clear(tables)
+
+    def _after_rollback(self, session):
+        session.info.pop('page_cache_tables', None)
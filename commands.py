@@ -0,0 +1,166 @@
+import json
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import bench
+from exporter import stream_export, EXPORTS, FORMATS
+from importer import Importer, KINDS
+from models import db, Venue, Artist
+from stats import STATS, refresh
+
+
+# flask fyyur <command>
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance and benchmarking commands.')
+
+
+@fyyur_cli.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=5000, show_default=True)
+@click.option('--shows', default=50000, show_default=True)
+@click.option('--cities', default=500, show_default=True, help='Size of the long tail of small towns.')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--truncate', is_flag=True, help='Empty show, venue and artist first.')
+@click.option('--seed', 'seed_value', default=0, show_default=True, help='Random seed.')
+def seed_command(venues, artists, shows, cities, batch_size, truncate, seed_value):
+    """Fill the configured database with generated data.
+
+    Point DATABASE_URL at a disposable database and run `flask db upgrade`
+    before seeding.
+    """
+    bench.seed(venues, artists, shows, cities=cities, batch_size=batch_size,
+               truncate=truncate, seed_value=seed_value, echo=click.echo)
+
+
+@fyyur_cli.command('bench')
+@click.option('--requests', default=50, show_default=True, help='Measured requests per route.')
+@click.option('--route', 'only', multiple=True, help='Only run this route (repeatable).')
+@click.option('--url', help='Load-test a running server at this base URL instead of the test client.')
+@click.option('--workers', default=8, show_default=True, help='Concurrent HTTP workers with --url.')
+@click.option('--concurrency', default=1, show_default=True, help='Concurrent test client threads without --url.')
+@click.option('--mode', type=click.Choice(['sync', 'async', 'both']),
+              help='Serve detail pages from the sync session, the async engine, or run once with each.')
+@click.option('--no-cache', is_flag=True, help='Bypass the page and feed caches while measuring.')
+@click.option('--json', 'as_json', is_flag=True, help='Print results as JSON.')
+@click.option('--thresholds', type=click.Path(), help='Fail if any route exceeds this threshold file.')
+@click.option('--save-thresholds', type=click.Path(), help='Write the results as a new threshold file.')
+@click.option('--headroom', default=1.5, show_default=True, help='Multiplier applied by --save-thresholds.')
+def bench_command(requests, only, url, workers, concurrency, mode, no_cache, as_json, thresholds,
+                  save_thresholds, headroom):
+    """Measure latency, SQL statements and memory for every route.
+
+    To compare the async mode with the sync one under the same load, run
+    `--mode both --concurrency 32` (test client), or point --url at the same
+    server started with and without FYYUR_ASYNC=1.
+    """
+    if no_cache:
+        current_app.extensions['page_cache'].disable()
+        current_app.extensions['feed_cache'].disable()
+
+    routes = bench.route_table()
+    if url:
+        results = bench.run_http(url, routes, requests, workers, only=only)
+    elif mode:
+        async_db = current_app.extensions['async_db']
+        results = []
+        for each in (['sync', 'async'] if mode == 'both' else [mode]):
+            async_db.enabled = each == 'async'
+            for result in bench.run_client(current_app, routes, requests, only=only, workers=concurrency):
+                if mode == 'both':
+                    result['route'] += ' [%s]' % each
+                results.append(result)
+    else:
+        results = bench.run_client(current_app, routes, requests, only=only, workers=concurrency)
+
+    click.echo(json.dumps(results, indent=2) if as_json else bench.format_table(results))
+
+    if save_thresholds:
+        bench.save_thresholds(save_thresholds, results, headroom)
+        click.echo('thresholds written to %s' % save_thresholds)
+    if thresholds:
+        if not os.path.exists(thresholds):
+            raise click.ClickException('no threshold file at %s; create one with --save-thresholds' % thresholds)
+        failures = bench.check_thresholds(thresholds, results)
+        for failure in failures:
+            click.echo('REGRESSION ' + failure, err=True)
+        if failures:
+            raise SystemExit(1)
+
+
+@fyyur_cli.command('bench-forms')
+@click.argument('kind', type=click.Choice(['venues', 'artists']), default='venues')
+@click.option('--rows', default=10000, show_default=True)
+@click.option('--json', 'as_json', is_flag=True, help='Print results as JSON.')
+def bench_forms_command(kind, rows, as_json):
+    """Measure form validations per second, single and batched."""
+    results = bench.run_validation(kind, rows)
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            click.echo('%(method)-18s %(rows)d rows, %(valid)d valid, %(seconds)ss, %(validations_per_s)s/s' % result)
+
+
+@fyyur_cli.command('bench-rows')
+@click.argument('kind', type=click.Choice(sorted(bench.READ_COLUMNS)), default='venues')
+@click.option('--rows', default=100000, show_default=True)
+@click.option('--json', 'as_json', is_flag=True, help='Print results as JSON.')
+def bench_rows_command(kind, rows, as_json):
+    """Compare ORM entities with plain rows for listing reads."""
+    results = bench.run_read_paths(kind, rows)
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            click.echo('%(method)-14s %(rows)d rows, %(seconds)ss, %(rows_per_s)s rows/s, %(bytes_per_row)s bytes/row' % result)
+
+
+@fyyur_cli.command('refresh-stats')
+@click.option('--all', 'everything', is_flag=True, help='Recompute every row, not only the stale and missing ones.')
+def refresh_stats_command(everything):
+    """Recompute venue_stats and artist_stats.
+
+    Rows go stale when their next show starts; pages count those venues and
+    artists directly until the row is refreshed. Run this every few minutes
+    (e.g. from cron) to keep pages on the precomputed counts.
+    """
+    for model in (Venue, Artist):
+        if everything:
+            count = refresh(model)
+        else:
+            count = refresh(model, stale=True, missing=True)
+        db.session.commit()
+        click.echo('%s: %d rows refreshed' % (STATS[model][0].__tablename__, count))
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per transaction.')
+@click.option('--copy', 'use_copy', is_flag=True, help='Write with COPY instead of batched INSERTs.')
+@click.option('--rejects', type=click.Path(dir_okay=False), help='Append rejected rows and their errors here (NDJSON).')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and start from the first row.')
+def import_command(kind, path, fmt, chunk_size, use_copy, rejects, restart):
+    """Bulk-load venues, artists or shows from a CSV or NDJSON file.
+
+    Rows are validated with the same rules as the create forms. Columns are
+    named after the form fields; venue and artist files may carry an `id`
+    column that show files then refer to. Import venues and artists before
+    their shows. Re-running the same command resumes after the last chunk
+    that was committed.
+    """
+    Importer(kind, path, fmt=fmt, chunk_size=chunk_size, use_copy=use_copy,
+             rejects=rejects, restart=restart, echo=click.echo).run()
+
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='ndjson', show_default=True)
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+def export_command(kind, fmt, output):
+    """Stream every venue, artist or show as NDJSON or CSV."""
+    for chunk in stream_export(kind, fmt):
+        output.write(chunk)
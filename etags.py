@@ -0,0 +1,104 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session as flask_session
+from sqlalchemy import select
+
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+# A validator returns the tables a page is read from and the scalar
+# subqueries whose values change whenever the rendered page would: row
+# counts catch deletes, max(updated_at) catches inserts and edits (both are
+# served by the updated_at indexes), and the next upcoming start_time catches
+# a show moving from "upcoming" to "past" as time goes by.
+
+def _table_state(model, *criteria):
+    return [
+        select(db.func.count()).select_from(model).where(*criteria).scalar_subquery(),
+        select(db.func.max(model.updated_at)).where(*criteria).scalar_subquery(),
+    ]
+
+
+def _next_show(*criteria):
+    return [
+        select(db.func.min(Show.start_time)).where(
+            Show.start_time > db.func.now(), *criteria).scalar_subquery().label('next_show'),
+    ]
+
+
+def venues_state():
+    return ('venue', 'show'), _table_state(Venue) + _table_state(Show) + _next_show()
+
+
+def artists_state():
+    return ('artist',), _table_state(Artist)
+
+
+def shows_state():
+    return ('show', 'venue', 'artist'), _table_state(Show) + _table_state(Venue) + _table_state(Artist)
+
+
+def venue_state(venue_id):
+    artist_ids = select(Show.artist_id).where(Show.venue_id == venue_id)
+    return ('venue', 'show', 'artist'), (
+        _table_state(Venue, Venue.id == venue_id)
+        + _table_state(Show, Show.venue_id == venue_id)
+        + _table_state(Artist, Artist.id.in_(artist_ids))
+        + _next_show(Show.venue_id == venue_id))
+
+
+def artist_state(artist_id):
+    venue_ids = select(Show.venue_id).where(Show.artist_id == artist_id)
+    return ('artist', 'show', 'venue'), (
+        _table_state(Artist, Artist.id == artist_id)
+        + _table_state(Show, Show.artist_id == artist_id)
+        + _table_state(Venue, Venue.id.in_(venue_ids))
+        + _next_show(Show.artist_id == artist_id))
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def conditional(validator):
+    """Answers GETs whose If-None-Match matches the page's ETag with a 304.
+
+    The validator is evaluated in one query before the view runs (or read
+    from the page cache, see PageCache.validator_state), so a 304 never
+    renders the template. The ETag is strong: it hashes the validator values
+    together with the full request path.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pages carrying a flash message are one-offs
+            if request.method != 'GET' or flask_session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            tables, state = validator(*args, **kwargs)
+            key = '%s:%r' % (request.endpoint, sorted(kwargs.items()))
+            state = current_app.extensions['page_cache'].validator_state(key, tables, select(*state))
+            etag = hashlib.sha1(repr((request.full_path, state)).encode()).hexdigest()
+            modified = [value for value in state if hasattr(value, 'tzinfo') and value.tzinfo]
+
+            # Only the ETag decides a 304: Last-Modified alone cannot see deletes.
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if modified:
+                response.last_modified = max(modified)
+            # let browsers and the CDN keep the body but revalidate every time
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
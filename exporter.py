@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+# Columns are named like the import columns, so an export can be fed back
+# into `flask fyyur import`.
+EXPORTS = {
+    'venues': [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+               Venue.genres, Venue.image_link, Venue.facebook_link, Venue.website_link,
+               Venue.seeking_talent, Venue.seeking_description],
+    'artists': [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone, Artist.genres,
+                Artist.image_link, Artist.facebook_link, Artist.website_link,
+                Artist.seeking_venue, Artist.seeking_description],
+    'shows': [Show.id, Show.artist_id, Show.venue_id, Show.start_time,
+              # minutes, as ShowForm takes them
+              db.cast(db.func.extract('epoch', Show.duration) / 60, db.Integer).label('duration')],
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# rows pulled from the server-side cursor per round trip
+BATCH_SIZE = 2000
+
+# the only format ShowForm's DateTimeField accepts (seconds are kept,
+# fractions of a second dropped)
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return str(value)
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def stream_export(kind, fmt, batch_size=BATCH_SIZE):
+    """Yields the whole table as NDJSON or CSV text, one batch of rows at a time.
+
+    Rows come from a server-side cursor (stream_results), so neither the
+    database driver nor this generator ever holds more than one batch.
+    """
+    columns = EXPORTS[kind]
+    names = [column.key for column in columns]
+    statement = select(*columns).order_by(columns[0]).execution_options(stream_results=True)
+    result = db.session.execute(statement)
+
+    try:
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+            for batch in result.partitions(batch_size):
+                for row in batch:
+                    writer.writerow([_csv_value(value) for value in row])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for batch in result.partitions(batch_size):
+                yield ''.join(
+                    json.dumps(dict(zip(names, row)), default=_json_default) + '\n' for row in batch)
+    finally:
+        result.close()
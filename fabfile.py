@@ -4,11 +4,14 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
+# route benchmark; fails when a route exceeds perf_thresholds.json
+# (record a baseline first with `flask fyyur bench --save-thresholds perf_thresholds.json`)
+BENCH = "FLASK_APP=app.py flask fyyur bench --thresholds perf_thresholds.json"
+
+
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local(BENCH, capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,9 +42,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run '{}'".format(BENCH))
 
 
 def deploy():
@@ -0,0 +1,213 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Response, abort, current_app, g, request, stream_with_context
+from sqlalchemy import event, inspect, select
+
+from cache import NullBackend, backend_from_config
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# iCalendar feeds.
+#----------------------------------------------------------------------------#
+
+# owner kind -> (owner model, the show column pointing at it, the far side
+# of its shows and the one column of it a feed needs)
+FEEDS = {
+    'venue': (Venue, Show.venue_id, Artist, Artist.name),
+    'artist': (Artist, Show.artist_id, Venue, Venue.name),
+}
+
+# rows pulled from the server-side cursor per round trip
+BATCH_SIZE = 500
+
+
+def window(now=None):
+    # [start, end) of the shows a feed lists, around now
+    now = now or datetime.now()
+    config = current_app.config
+    return now - timedelta(days=config['FEED_PAST_DAYS']), now + timedelta(days=config['FEED_FUTURE_DAYS'])
+
+
+def feed_statement(kind, owner_id, start, end):
+    # a range scan of the (owner_id, start_time) index joined to the one
+    # column of the far side that the events show
+    model, owner_key, other, other_name = FEEDS[kind]
+    return (
+        select(Show.id, Show.start_time, Show.duration, Show.updated_at, other_name.label('other_name'))
+        .select_from(Show).join(other)
+        .where(owner_key == owner_id, Show.start_time >= start, Show.start_time < end)
+        .order_by(Show.start_time, Show.id)
+    )
+
+
+def _text(value):
+    # TEXT escaping of RFC 5545 3.3.11
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _line(line):
+    # content lines are folded at 75 octets, continuation lines start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start = [], 0
+    while start < len(encoded):
+        size = 75 if not parts else 74
+        end = min(start + size, len(encoded))
+        # never split a UTF-8 sequence
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        start = end
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _local(value):
+    # start times are naive, so events use floating (local) times
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _utc(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _event(kind, name, show, host):
+    summary = '%s at %s' % (show.other_name, name) if kind == 'venue' else '%s at %s' % (name, show.other_name)
+    return ''.join((
+        'BEGIN:VEVENT\r\n',
+        'UID:show-%d@%s\r\n' % (show.id, host),
+        'DTSTAMP:%s\r\n' % _utc(show.updated_at),
+        'DTSTART:%s\r\n' % _local(show.start_time),
+        'DTEND:%s\r\n' % _local(show.start_time + show.duration),
+        _line('SUMMARY:' + _text(summary)),
+        'END:VEVENT\r\n',
+    ))
+
+
+def stream_feed(kind, owner_id, name, start, end, batch_size=BATCH_SIZE):
+    """Yields the VCALENDAR of one venue's (or artist's) shows between start
+    and end, one batch of events at a time, from a server-side cursor.
+    """
+    host = request.host.split(':')[0]
+    yield ''.join((
+        'BEGIN:VCALENDAR\r\n',
+        'VERSION:2.0\r\n',
+        'PRODID:-//Fyyur//Shows//EN\r\n',
+        'CALSCALE:GREGORIAN\r\n',
+        _line('X-WR-CALNAME:' + _text('%s - Fyyur shows' % name)),
+    ))
+    statement = feed_statement(kind, owner_id, start, end).execution_options(stream_results=True)
+    result = db.session.execute(statement)
+    try:
+        for batch in result.partitions(batch_size):
+            yield ''.join(_event(kind, name, show, host) for show in batch)
+    finally:
+        result.close()
+    yield 'END:VCALENDAR\r\n'
+
+
+#----------------------------------------------------------------------------#
+# Feed cache.
+#----------------------------------------------------------------------------#
+
+class FeedCache:
+    """Caches whole feed bodies per venue and per artist.
+
+    A miss streams the feed to the client and stores the body once the last
+    chunk is out. A commit that adds, moves or deletes a show starting within
+    the feed window drops the feeds of its venue and artist (before and after
+    the change); edits to a venue or artist drop their own feed. Anything
+    else is left to FEED_CACHE_TIMEOUT, e.g. a renamed venue in the feeds of
+    the artists playing there.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.timeout = 0
+        self.invalidated_at = float('-inf')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = backend_from_config(app, app.config.get('CACHE_KEY_PREFIX', 'fyyur') + ':feeds')
+        self.timeout = app.config.get('FEED_CACHE_TIMEOUT', 300)
+        app.extensions['feed_cache'] = self
+
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def response(self, kind, owner_id):
+        # the feed of one venue or artist, cached or streamed; a hit costs
+        # no query at all
+        key = 'feed:%s:%d' % (kind, owner_id)
+        hit = self.backend.get(key)
+        if hit is not None:
+            body, etag = hit
+            response = Response(body, mimetype='text/calendar')
+            response.set_etag(etag)
+            return response.make_conditional(request)
+
+        model = FEEDS[kind][0]
+        name = db.session.query(model.name).filter(model.id == owner_id).scalar()
+        if name is None:
+            abort(404)
+        start, end = window()
+        stale = g.get('db_replica') is not None and \
+            time.monotonic() - self.invalidated_at < current_app.config.get('REPLICA_MAX_LAG_SECONDS', 0)
+
+        def generate():
+            chunks = []
+            for chunk in stream_feed(kind, owner_id, name, start, end):
+                chunks.append(chunk)
+                yield chunk
+            # a feed read from a replica shortly after an invalidation may
+            # predate the change, so it is served but not stored
+            if not stale:
+                body = ''.join(chunks).encode('utf-8')
+                self.backend.set(key, (body, hashlib.sha1(body).hexdigest()), self.timeout)
+        return Response(stream_with_context(generate()), mimetype='text/calendar')
+
+    def clear(self):
+        self.invalidated_at = time.monotonic()
+        self.backend.clear()
+
+    def disable(self):
+        self.backend = NullBackend()
+
+    # invalidation hooks ------------------------------------------------------
+
+    def _after_flush(self, session, flush_context):
+        start, end = window()
+        keys = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, Show):
+                # the old and the new time, venue and artist of a moved show
+                state = inspect(obj).attrs
+                times = state['start_time'].history
+                if not any(start <= moment < end for moment in (*times.unchanged, *times.added, *times.deleted)
+                           if moment is not None):
+                    continue
+                for kind, attr in (('venue', 'venue_id'), ('artist', 'artist_id')):
+                    history = state[attr].history
+                    keys.update('feed:%s:%d' % (kind, id)
+                                for id in (*history.unchanged, *history.added, *history.deleted) if id is not None)
+            elif isinstance(obj, Venue):
+                keys.add('feed:venue:%d' % obj.id)
+            elif isinstance(obj, Artist):
+                keys.add('feed:artist:%d' % obj.id)
+        if keys:
+            session.info.setdefault('feed_cache_keys', set()).update(keys)
+
+    def _after_commit(self, session):
+        keys = session.info.pop('feed_cache_keys', None)
+        if keys:
+            self.invalidated_at = time.monotonic()
+            for key in keys:
+                self.backend.delete(key)
+
+    def _after_rollback(self, session):
+        session.info.pop('feed_cache_keys', None)
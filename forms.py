@@ -5,9 +5,11 @@ from wtforms import (
     SelectField, 
     SelectMultipleField, 
     DateTimeField, 
-    BooleanField
+    BooleanField,
+    IntegerField
     )
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
+from werkzeug.datastructures import MultiDict
 
 import re
 
@@ -90,23 +92,34 @@ genres_choices = [
             ('Other', 'Other'),
         ]
 
+# built once at import; validate() only does set lookups and one regex match
+GENRE_NAMES = frozenset(name for name, _ in Genre.choices())
+STATE_NAMES = frozenset(name for name, _ in State.choices())
+PHONE = re.compile(r'^\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
+
 def is_valid_phone(number):
-    regex = re.compile('^\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
-    return regex.match(number)
+    return PHONE.match(number)
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default = datetime.today(),
+        # called on every form, not frozen at import time
+        default = datetime.today,
         # format = "%Y-%m-%d %H:%M"
     )
+    # minutes the venue and the artist are booked for, from start_time
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default = 120
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -146,18 +159,18 @@ class VenueForm(Form):
         'seeking_description'
     )
     
-    def validate(self):
-        rv = FlaskForm.validate(self)
+    def validate(self, extra_validators=None):
+        rv = Form.validate(self, extra_validators)
         
         if not rv:
             return False
-        if not is_valid_phone(self.phone.data):
+        if not is_valid_phone(self.phone.data or ''):
             self.phone.errors.append('Invalid phone.')
             return False
-        if not set(self.genres.data).issubset(dict(Genre.choices()).keys()):
+        if not GENRE_NAMES.issuperset(self.genres.data):
             self.genres.errors.append('Invalid genres.')
             return False
-        if self.state.errors.data not in dict(State.choices()).keys():
+        if self.state.data not in STATE_NAMES:
             self.state.errors.append('Invalid state.')
             return False
         return True
@@ -199,19 +212,54 @@ class ArtistForm(Form):
             'seeking_description'
      )
     
-    def validate(self):
-        rv = FlaskForm.validate(self)
+    def validate(self, extra_validators=None):
+        rv = Form.validate(self, extra_validators)
         
         if not rv:
             return False
-        if not is_valid_phone(self.phone.data):
+        if not is_valid_phone(self.phone.data or ''):
             self.phone.errors.append('Invalid phone.')
             return False
-        if not set(self.genres.data).issubset(dict(Genre.choices()).keys()):
+        if not GENRE_NAMES.issuperset(self.genres.data):
             self.genres.errors.append('Invalid genres.')
             return False
-        if self.state.errors.data not in dict(State.choices()).keys():
+        if self.state.data not in STATE_NAMES:
             self.state.errors.append('Invalid state.')
             return False
         return True
 
+
+#----------------------------------------------------------------------------#
+# Bulk validation.
+#----------------------------------------------------------------------------#
+
+def to_formdata(row):
+    # a dict payload (JSON / CSV row) as the form data a browser would post
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None or value is False:
+            continue
+        if value is True:
+            value = 'y'
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(key, str(item))
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+def validate_many(form_class, rows):
+    """Validates a batch of dict payloads with one form instance.
+
+    Instantiating a form binds every field anew, which dominates the cost
+    of validating a small payload; here the fields are bound once and each
+    row is only processed and validated. Yields (data, errors) per row:
+    the form's data when valid, else None and the field errors.
+    """
+    form = form_class(formdata=None, meta={'csrf': False})
+    for row in rows:
+        form.process(formdata=to_formdata(row))
+        if form.validate():
+            yield form.data, None
+        else:
+            yield None, form.errors
@@ -0,0 +1,34 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# Worker processes times threads is the number of requests served at once.
+# Each worker has its own connection pool, so the database sees up to
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; keep that below the
+# server's max_connections, and DB_POOL_SIZE at or above `threads` so a
+# thread never waits for a connection under normal load.
+import multiprocessing
+import os
+
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '5000')
+
+# WEB_CONCURRENCY is set by Heroku according to the dyno size
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# a request stuck past the statement timeout is killed with its worker
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# recycle workers now and then so slow leaks cannot accumulate
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+
+raw_env = ['FYYUR_ENV=%s' % os.environ.get('FYYUR_ENV', 'production')]
+
+
+# The app is imported by each worker after the fork (no preload_app), so
+# no database connection or async loop thread is ever shared between workers.
@@ -0,0 +1,308 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import insert
+
+from forms import VenueForm, ArtistForm, ShowForm, validate_many
+from models import db, Venue, Artist, Show, ImportCheckpoint, DEFAULT_SHOW_DURATION
+from scheduling import chunk_conflicts
+from stats import refresh
+
+
+#----------------------------------------------------------------------------#
+# Kinds of records.
+#----------------------------------------------------------------------------#
+
+# Each kind is validated by the same form the create page uses, and the
+# listed columns are copied from the validated form into the table.
+KINDS = {
+    'venues': (Venue, VenueForm, [
+        'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+        'website_link', 'seeking_talent', 'seeking_description', 'genres']),
+    'artists': (Artist, ArtistForm, [
+        'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+        'seeking_description', 'seeking_venue', 'website_link']),
+    'shows': (Show, ShowForm, ['artist_id', 'venue_id', 'start_time', 'duration']),
+}
+
+
+# BooleanField treats any value but a few exact spellings of false as
+# checked, so a CSV cell reading 'False' or 'no' would come out True
+BOOLEAN_COLUMNS = ('seeking_talent', 'seeking_venue')
+FALSE_VALUES = {'', '0', 'f', 'false', 'n', 'no', 'off'}
+
+# ShowForm's DateTimeField takes only this format; ISO-8601 start times
+# ('T' separator, fractions of a second) are rewritten to it before
+# validation, fractions dropped
+DATETIME_COLUMNS = ('start_time',)
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class RowError(ValueError):
+    pass
+
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+def read_rows(path, fmt):
+    """Yields the records of a CSV or NDJSON file one at a time.
+
+    In CSV files a multi-valued column (genres) separates its values with
+    commas inside the quoted cell; in NDJSON it is a list. Boolean columns
+    may be spelled true/false, yes/no, 1/0 or y/empty in any case, and start
+    times may be ISO-8601 (as in 2026-05-01T20:00:00.5).
+    """
+    with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                if row.get('genres'):
+                    row['genres'] = [genre.strip() for genre in row['genres'].split(',') if genre.strip()]
+                yield _datetimes(_booleans(row))
+        else:
+            for line in f:
+                if line.strip():
+                    yield _datetimes(_booleans(json.loads(line)))
+
+
+def _booleans(row):
+    for column in BOOLEAN_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str):
+            row[column] = value.strip().lower() not in FALSE_VALUES
+    return row
+
+
+def _datetimes(row):
+    for column in DATETIME_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str) and value.strip():
+            try:
+                parsed = datetime.fromisoformat(value.strip())
+            except ValueError:
+                continue  # left for the form to reject
+            # times with an offset are left for the form to reject as well
+            if parsed.tzinfo is None:
+                row[column] = parsed.strftime(DATETIME_FORMAT)
+    return row
+
+
+def clean_row(kind, row, values):
+    # the column values of a row that passed its form, raises RowError otherwise
+    if kind == 'shows':
+        # minutes; the default booking unless the row has its own
+        values['duration'] = timedelta(minutes=values['duration']) if values['duration'] else DEFAULT_SHOW_DURATION
+    elif row.get('id') not in (None, ''):
+        # partner ids are kept so that their show files can refer to them
+        try:
+            values['id'] = int(row['id'])
+        except ValueError:
+            raise RowError({'id': ['Not an integer id.']})
+    return values
+
+
+def validate_rows(kind, rows):
+    """Yields, for each row, its column values or the RowError it failed with.
+
+    The whole batch goes through one form instance (forms.validate_many).
+    """
+    model, form_class, columns = KINDS[kind]
+    for row, (data, errors) in zip(rows, validate_many(form_class, rows)):
+        try:
+            if kind == 'shows' and not row.get('start_time'):
+                # ShowForm would fall back to its default start time
+                raise RowError({'start_time': ['This field is required.']})
+            if errors:
+                raise RowError(errors)
+            yield clean_row(kind, row, {column: data[column] for column in columns})
+        except RowError as e:
+            yield e
+
+
+#----------------------------------------------------------------------------#
+# Writing.
+#----------------------------------------------------------------------------#
+
+def _copy_value(value):
+    # PostgreSQL COPY text format
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        value = '{%s}' % ','.join(
+            '"%s"' % item.replace('\\', '\\\\').replace('"', '\\"') for item in value)
+    elif isinstance(value, datetime):
+        value = value.isoformat(sep=' ')
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def write_rows(table, rows, use_copy):
+    # rows with and without an explicit id cannot share one statement
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row), []).append(row)
+
+    for columns, group in groups.items():
+        if use_copy:
+            buffer = io.StringIO()
+            for row in group:
+                buffer.write('\t'.join(_copy_value(row[column]) for column in columns) + '\n')
+            buffer.seek(0)
+            # the raw DBAPI connection of the session, inside its transaction
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert('COPY %s (%s) FROM STDIN' % (table.name, ', '.join(columns)), buffer)
+        else:
+            db.session.execute(insert(table), group)
+
+
+def existing_ids(model, ids):
+    if not ids:
+        return set()
+    return {row.id for row in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+class Importer:
+    """Streams one file into the database in chunked transactions.
+
+    Memory use is bounded by the chunk size. Each chunk is written and its
+    checkpoint row updated in the same transaction, so an interrupted import
+    resumes after the last committed chunk without duplicating rows.
+    """
+
+    def __init__(self, kind, path, fmt=None, chunk_size=5000, use_copy=False,
+                 rejects=None, restart=False, echo=print):
+        self.kind = kind
+        self.path = path
+        self.fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        self.chunk_size = chunk_size
+        self.use_copy = use_copy
+        self.rejects = rejects
+        self.restart = restart
+        self.echo = echo
+        self.source = os.path.realpath(path)
+
+    def checkpoint(self):
+        checkpoint = db.session.get(ImportCheckpoint, self.source)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(source=self.source, kind=self.kind, rows_done=0, imported=0, rejected=0)
+            db.session.add(checkpoint)
+        elif self.restart:
+            checkpoint.rows_done = checkpoint.imported = checkpoint.rejected = 0
+        if checkpoint.kind != self.kind:
+            raise RuntimeError('%s was previously imported as %s' % (self.path, checkpoint.kind))
+        return checkpoint
+
+    def run(self):
+        model = KINDS[self.kind][0]
+        checkpoint = self.checkpoint()
+        db.session.commit()
+        if checkpoint.rows_done:
+            self.echo('resuming %s after row %d' % (self.path, checkpoint.rows_done))
+
+        rows = islice(read_rows(self.path, self.fmt), checkpoint.rows_done, None)
+        rejects = open(self.rejects, 'a', encoding='utf-8') if self.rejects else None
+        explicit_ids = False
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                first = checkpoint.rows_done + 1
+
+                valid, errors = [], []
+                outcomes = validate_rows(self.kind, chunk)
+                for number, (row, outcome) in enumerate(zip(chunk, outcomes), start=first):
+                    if isinstance(outcome, RowError):
+                        errors.append((number, row, outcome.args[0]))
+                    else:
+                        valid.append((number, outcome))
+
+                if self.kind == 'shows':
+                    valid, missing = self.resolve_references(valid)
+                    errors.extend(missing)
+                    valid, booked = self.reject_conflicts(valid)
+                    errors.extend(booked)
+                explicit_ids = explicit_ids or any('id' in values for _, values in valid)
+
+                write_rows(model.__table__, [values for _, values in valid], self.use_copy)
+                if self.kind == 'shows':
+                    # Core writes skip the ShowStats session hooks
+                    refresh(Venue, {values['venue_id'] for _, values in valid})
+                    refresh(Artist, {values['artist_id'] for _, values in valid})
+                checkpoint.rows_done += len(chunk)
+                checkpoint.imported += len(valid)
+                checkpoint.rejected += len(errors)
+                db.session.commit()
+
+                for number, row, error in errors:
+                    if rejects:
+                        rejects.write(json.dumps({'row': number, 'errors': error, 'data': row}, default=str) + '\n')
+                self.echo('%s: %d rows read, %d imported, %d rejected'
+                          % (self.path, checkpoint.rows_done, checkpoint.imported, checkpoint.rejected))
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            if rejects:
+                rejects.close()
+
+        if explicit_ids:
+            # move the id sequence past the ids that were inserted explicitly
+            db.session.execute(db.text(
+                "SELECT setval(pg_get_serial_sequence(:table, 'id'), (SELECT max(id) FROM %s))"
+                % model.__tablename__), {'table': model.__tablename__})
+            db.session.commit()
+
+        if self.kind != 'shows':
+            # zero rows for the new venues / artists
+            refresh(model, missing=True)
+            db.session.commit()
+
+        # Core inserts skip the ORM events the caches and home page lists listen to
+        for name in ('page_cache', 'feed_cache', 'recent_items'):
+            cache = current_app.extensions.get(name)
+            if cache is not None:
+                cache.clear()
+        return checkpoint
+
+    def reject_conflicts(self, valid):
+        # shows that would double-book a venue or an artist; left in, one of
+        # them would fail the whole chunk on the no-overlap constraints
+        clashing = chunk_conflicts([values for _, values in valid])
+        kept, rejected = [], []
+        for i, (number, values) in enumerate(valid):
+            if i in clashing:
+                rejected.append((number, values, {'start_time': ['The venue or the artist is already booked then.']}))
+            else:
+                kept.append((number, values))
+        return kept, rejected
+
+    def resolve_references(self, valid):
+        # one IN query per side and chunk instead of a lookup per show
+        artists = existing_ids(Artist, {values['artist_id'] for _, values in valid})
+        venues = existing_ids(Venue, {values['venue_id'] for _, values in valid})
+        resolved, missing = [], []
+        for number, values in valid:
+            problems = {}
+            if values['artist_id'] not in artists:
+                problems['artist_id'] = ['No artist with id %d.' % values['artist_id']]
+            if values['venue_id'] not in venues:
+                problems['venue_id'] = ['No venue with id %d.' % values['venue_id']]
+            if problems:
+                missing.append((number, values, problems))
+            else:
+                resolved.append((number, values))
+        return resolved, missing
@@ -0,0 +1,40 @@
+"""trigram search indexes on venue and artist
+
+Revision ID: 3f5a2b9d4c81
+Revises: c0156bcb49a6
+Create Date: 2026-10-18 09:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f5a2b9d4c81'
+down_revision = 'c0156bcb49a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets GIN indexes answer LIKE '%term%' and similarity() lookups
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    op.create_index('ix_venue_lower_name_trgm', 'venue',
+                    [sa.text('lower(name) gin_trgm_ops')], postgresql_using='gin')
+    op.create_index('ix_artist_lower_name_trgm', 'artist',
+                    [sa.text('lower(name) gin_trgm_ops')], postgresql_using='gin')
+
+    # "City, ST" searches
+    op.create_index('ix_venue_state_lower_city', 'venue',
+                    ['state', sa.text('lower(city)')])
+    op.create_index('ix_artist_state_lower_city', 'artist',
+                    ['state', sa.text('lower(city)')])
+
+
+def downgrade():
+    op.drop_index('ix_artist_state_lower_city', table_name='artist')
+    op.drop_index('ix_venue_state_lower_city', table_name='venue')
+    op.drop_index('ix_artist_lower_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_lower_name_trgm', table_name='venue')
+    # the extension is left installed; other objects may depend on it
@@ -0,0 +1,46 @@
+"""keyset pagination indexes for the listing pages
+
+Revision ID: 8d24c6e1f0b7
+Revises: 3f5a2b9d4c81
+Create Date: 2026-10-18 10:03:12.527940
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d24c6e1f0b7'
+down_revision = '3f5a2b9d4c81'
+branch_labels = None
+depends_on = None
+
+
+# The sort columns of the listings. A NULL among them would compare as NULL
+# in the (name, id) > (...) row comparison of a cursor and end the listing
+# there, so they are made NOT NULL, with '' for missing values.
+KEYSET_COLUMNS = {
+    'artist': ['name'],
+    'venue': ['state', 'city', 'name'],
+}
+
+
+def upgrade():
+    for table, columns in KEYSET_COLUMNS.items():
+        for column in columns:
+            op.execute("UPDATE %s SET %s = '' WHERE %s IS NULL" % (table, column, column))
+            op.alter_column(table, column, nullable=False)
+
+    # each index matches the ORDER BY of one listing, so a page is a range scan
+    op.create_index('ix_artist_name_id', 'artist', ['name', 'id'])
+    op.create_index('ix_venue_state_city_name_id', 'venue', ['state', 'city', 'name', 'id'])
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
+    op.drop_index('ix_venue_state_city_name_id', table_name='venue')
+    op.drop_index('ix_artist_name_id', table_name='artist')
+
+    for table, columns in KEYSET_COLUMNS.items():
+        for column in columns:
+            op.alter_column(table, column, nullable=True)
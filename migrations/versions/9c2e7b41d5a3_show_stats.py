@@ -0,0 +1,52 @@
+"""venue_stats and artist_stats
+
+Revision ID: 9c2e7b41d5a3
+Revises: 5a0d8f2c6e19
+Create Date: 2026-10-18 17:40:12.508311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e7b41d5a3'
+down_revision = '5a0d8f2c6e19'
+branch_labels = None
+depends_on = None
+
+
+STATS = (('venue_stats', 'venue_id', 'venue'), ('artist_stats', 'artist_id', 'artist'))
+
+
+def upgrade():
+    for table, key, owner in STATS:
+        op.create_table(table,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('past_shows_count', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+        sa.Column('next_show_time', sa.DateTime(), nullable=True),
+        sa.Column('last_show_time', sa.DateTime(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint([key], ['%s.id' % owner], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key)
+        )
+        op.create_index(op.f('ix_%s_next_show_time' % table), table, ['next_show_time'], unique=False)
+
+        # backfill from the existing shows
+        op.execute("""
+            INSERT INTO {table} ({key}, past_shows_count, upcoming_shows_count, next_show_time, last_show_time)
+            SELECT {owner}.id,
+                   count(show.id) FILTER (WHERE show.start_time <= now()),
+                   count(show.id) FILTER (WHERE show.start_time > now()),
+                   min(show.start_time) FILTER (WHERE show.start_time > now()),
+                   max(show.start_time) FILTER (WHERE show.start_time <= now())
+            FROM {owner} LEFT JOIN show ON show.{key} = {owner}.id
+            GROUP BY {owner}.id
+        """.format(table=table, key=key, owner=owner))
+
+
+def downgrade():
+    for table, key, owner in STATS:
+        op.drop_index(op.f('ix_%s_next_show_time' % table), table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,29 @@
+"""updated_at indexes for the conditional GET validators
+
+Revision ID: a6c1d8e3f720
+Revises: f7b2c90e4a15
+Create Date: 2026-10-18 21:12:40.318552
+
+etags.conditional reads max(updated_at) of the tables behind a page on every
+request it does not have cached; these keep that an index-only lookup.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c1d8e3f720'
+down_revision = 'f7b2c90e4a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.create_index('ix_%s_updated_at' % table, table, ['updated_at'])
+
+
+def downgrade():
+    for table in ('show', 'artist', 'venue'):
+        op.drop_index('ix_%s_updated_at' % table, table_name=table)
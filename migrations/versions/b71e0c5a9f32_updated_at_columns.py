@@ -0,0 +1,27 @@
+"""updated_at columns for conditional GET
+
+Revision ID: b71e0c5a9f32
+Revises: 8d24c6e1f0b7
+Create Date: 2026-10-18 11:26:05.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e0c5a9f32'
+down_revision = '8d24c6e1f0b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                                       server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    for table in ('show', 'artist', 'venue'):
+        op.drop_column(table, 'updated_at')
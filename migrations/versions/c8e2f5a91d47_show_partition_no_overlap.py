@@ -0,0 +1,80 @@
+"""no-overlap trigger for a partitioned show
+
+Revision ID: c8e2f5a91d47
+Revises: a6c1d8e3f720
+Create Date: 2026-10-18 22:03:16.842190
+
+A partitioned `show` (see e4c93a17d2b6) cannot carry the exclusion
+constraints of f7b2c90e4a15: they would have to include the partition key,
+and would then only compare shows within one month. There, a BEFORE INSERT
+OR UPDATE trigger rejects overlapping bookings across all partitions instead.
+It takes a transaction-level advisory lock on the venue and on the artist
+before looking, so that two transactions booking either of them run the
+check one after the other, and raises exclusion_violation (23P01) naming the
+constraint the plain table would have violated, which scheduling.is_conflict
+already recognizes.
+
+Nothing is installed on an unpartitioned `show`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2f5a91d47'
+down_revision = 'a6c1d8e3f720'
+branch_labels = None
+depends_on = None
+
+CREATE_FUNCTION = """
+CREATE FUNCTION show_no_overlap() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    other record;
+BEGIN
+    -- held until commit or rollback; the key spaces keep venue and artist
+    -- ids apart
+    PERFORM pg_advisory_xact_lock(hashtext('show_venue_no_overlap'), NEW.venue_id);
+    PERFORM pg_advisory_xact_lock(hashtext('show_artist_no_overlap'), NEW.artist_id);
+
+    -- a new snapshot, so bookings committed while waiting for the locks count
+    SELECT id, venue_id INTO other FROM show
+     WHERE (venue_id = NEW.venue_id OR artist_id = NEW.artist_id)
+       AND id <> NEW.id
+       AND tsrange(start_time, start_time + duration)
+           && tsrange(NEW.start_time, NEW.start_time + NEW.duration)
+     LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'show overlaps show %', other.id
+            USING ERRCODE = 'exclusion_violation',
+                  CONSTRAINT = CASE WHEN other.venue_id = NEW.venue_id
+                                    THEN 'show_venue_no_overlap' ELSE 'show_artist_no_overlap' END;
+    END IF;
+    RETURN NEW;
+END
+$$
+"""
+
+CREATE_TRIGGER = """
+CREATE TRIGGER show_no_overlap
+    BEFORE INSERT OR UPDATE OF venue_id, artist_id, start_time, duration ON show
+    FOR EACH ROW EXECUTE FUNCTION show_no_overlap()
+"""
+
+
+def _is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'show'::regclass)"
+    )).scalar()
+
+
+def upgrade():
+    if _is_partitioned(op.get_bind()):
+        op.execute(CREATE_FUNCTION)
+        op.execute(CREATE_TRIGGER)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS show_no_overlap ON show')
+    op.execute('DROP FUNCTION IF EXISTS show_no_overlap()')
@@ -0,0 +1,56 @@
+"""genres as a genre[] enum array with GIN indexes
+
+Revision ID: d3a8f61c2b94
+Revises: 9c2e7b41d5a3
+Create Date: 2026-10-18 18:32:47.190264
+
+"""
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f61c2b94'
+down_revision = '9c2e7b41d5a3'
+branch_labels = None
+depends_on = None
+
+
+# enums.Genre as of this revision: name -> label
+GENRES = (
+    ('Alternative', 'Alternative'), ('Blues', 'Blues'), ('Classical', 'Classical'),
+    ('Country', 'Country'), ('Electronic', 'Electronic'), ('Folk', 'Folk'), ('Funk', 'Funk'),
+    ('HipHop', 'Hip-Hop'), ('Heavy_Metal', 'Heavy Metal'), ('Instrumental', 'Instrumental'),
+    ('Jazz', 'Jazz'), ('Musical_Theatre', 'Musical Theatre'), ('Pop', 'Pop'), ('Punk', 'Punk'),
+    ('RnB', 'R&B'), ('Reggae', 'Reggae'), ('Rock_n_Roll', 'Rock n Roll'), ('Soul', 'Soul'),
+    ('Other', 'Other'),
+)
+genre = postgresql.ENUM(*(name for name, _ in GENRES), name='genre')
+
+TABLES = ('venue', 'artist')
+
+
+def upgrade():
+    genre.create(op.get_bind())
+
+    # Rows hold genre names, as the forms submit them, but older rows may
+    # hold the labels ('Hip-Hop'); both map to the name. Anything else is
+    # dropped, as it could never be selected in the forms anyway.
+    lookup = ', '.join("('%s', '%s')" % (value, name) for name, label in GENRES for value in {name, label})
+    for table in TABLES:
+        op.execute("""
+            UPDATE %(table)s SET genres = ARRAY(
+                SELECT m.name FROM unnest(genres) WITH ORDINALITY AS g(value, i)
+                JOIN (VALUES %(lookup)s) AS m(value, name) USING (value)
+                ORDER BY g.i)
+            WHERE genres IS NOT NULL
+        """ % {'table': table, 'lookup': lookup})
+        op.execute('ALTER TABLE %s ALTER COLUMN genres TYPE genre[] USING genres::text[]::genre[]' % table)
+        op.create_index('ix_%s_genres' % table, table, ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_%s_genres' % table, table_name=table)
+        op.execute('ALTER TABLE %s ALTER COLUMN genres TYPE varchar(120)[] USING genres::text[]' % table)
+    genre.drop(op.get_bind())
@@ -0,0 +1,108 @@
+"""show start_time indexes, id primary key, optional monthly partitioning
+
+Revision ID: e4c93a17d2b6
+Revises: b71e0c5a9f32
+Create Date: 2026-10-18 12:41:57.310862
+
+Partitioning is opt-in:
+
+    flask db upgrade -x partition_show=true
+
+rebuilds `show` as a table partitioned by month on start_time, with one
+partition per month from the earliest show to PARTITION_MONTHS_AHEAD months
+from now and a default partition for anything outside that range.
+
+"""
+from datetime import date
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c93a17d2b6'
+down_revision = 'b71e0c5a9f32'
+branch_labels = None
+depends_on = None
+
+PARTITION_MONTHS_AHEAD = 24
+
+SHOW_INDEXES = [
+    ('ix_show_start_time_id', ['start_time', 'id']),
+    ('ix_show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', ['artist_id', 'start_time']),
+]
+
+
+def _partition_requested():
+    return context.get_x_argument(as_dictionary=True).get('partition_show', '').lower() in ('1', 'true', 'yes')
+
+
+def _is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'show'::regclass)"
+    )).scalar()
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _rebuild_show(partitioned):
+    # Copies show into a fresh table, either partitioned by month or plain.
+    # Indexes created on a partitioned parent cascade to every partition.
+    bind = op.get_bind()
+    op.rename_table('show', 'show_old')
+    op.execute('ALTER TABLE show_old DROP CONSTRAINT IF EXISTS show_pkey')
+    for name, _ in SHOW_INDEXES:
+        op.drop_index(name, table_name='show_old')
+
+    if partitioned:
+        op.execute('CREATE TABLE show (LIKE show_old INCLUDING DEFAULTS) PARTITION BY RANGE (start_time)')
+        # the partition key has to be part of the primary key
+        op.create_primary_key('show_pkey', 'show', ['id', 'start_time'])
+
+        first = bind.execute(sa.text('SELECT min(start_time) FROM show_old')).scalar()
+        month = (first.date() if first else date.today()).replace(day=1)
+        last = _add_months(date.today().replace(day=1), PARTITION_MONTHS_AHEAD)
+        while month <= last:
+            following = _add_months(month, 1)
+            op.execute("CREATE TABLE show_y%dm%02d PARTITION OF show FOR VALUES FROM ('%s') TO ('%s')"
+                       % (month.year, month.month, month.isoformat(), following.isoformat()))
+            month = following
+        op.execute('CREATE TABLE show_default PARTITION OF show DEFAULT')
+    else:
+        op.execute('CREATE TABLE show (LIKE show_old INCLUDING DEFAULTS)')
+        op.create_primary_key('show_pkey', 'show', ['id'])
+
+    op.create_foreign_key('show_artist_id_fkey', 'show', 'artist', ['artist_id'], ['id'])
+    op.create_foreign_key('show_venue_id_fkey', 'show', 'venue', ['venue_id'], ['id'])
+    for name, columns in SHOW_INDEXES:
+        op.create_index(name, 'show', columns)
+
+    op.execute('INSERT INTO show SELECT * FROM show_old')
+    # the id sequence moves with the column it feeds
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY show.id')
+    op.drop_table('show_old')
+
+
+def upgrade():
+    # the old (id, artist_id, venue_id) key is not used by any query
+    op.drop_constraint('show_pkey', 'show', type_='primary')
+    op.create_primary_key('show_pkey', 'show', ['id'])
+    op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'])
+    op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'])
+
+    if _partition_requested():
+        _rebuild_show(partitioned=True)
+
+
+def downgrade():
+    if _is_partitioned(op.get_bind()):
+        _rebuild_show(partitioned=False)
+
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
+    op.drop_constraint('show_pkey', 'show', type_='primary')
+    op.create_primary_key('show_pkey', 'show', ['id', 'artist_id', 'venue_id'])
@@ -0,0 +1,69 @@
+"""show duration and no-overlap exclusion constraints
+
+Revision ID: f7b2c90e4a15
+Revises: d3a8f61c2b94
+Create Date: 2026-10-18 19:05:21.644019
+
+Existing shows get the default duration of 2 hours, cut short where the next
+show of the same venue or artist starts earlier, so that the stored schedule
+satisfies the constraints. Start times are left untouched.
+
+Exclusion constraints are not supported on a partitioned `show` (see
+e4c93a17d2b6); there the same expressions get plain GiST indexes, and the
+trigger of c8e2f5a91d47 rejects overlaps.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b2c90e4a15'
+down_revision = 'd3a8f61c2b94'
+branch_labels = None
+depends_on = None
+
+PERIOD = 'tsrange(start_time, start_time + duration)'
+SIDES = (('show_venue_no_overlap', 'venue_id'), ('show_artist_no_overlap', 'artist_id'))
+
+
+def _is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'show'::regclass)"
+    )).scalar()
+
+
+def upgrade():
+    # GiST operator classes for the integer = parts
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('show', sa.Column('duration', sa.Interval(), server_default=sa.text("'2 hours'"), nullable=False))
+
+    op.execute("""
+        UPDATE show SET duration = fitted.duration
+        FROM (
+            SELECT id, start_time, LEAST(
+                interval '2 hours',
+                lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) - start_time,
+                lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) - start_time
+            ) AS duration
+            FROM show
+        ) AS fitted
+        WHERE show.id = fitted.id AND show.start_time = fitted.start_time
+          AND fitted.duration < interval '2 hours'
+    """)
+
+    if _is_partitioned(op.get_bind()):
+        for name, key in SIDES:
+            op.execute('CREATE INDEX %s ON show USING gist (%s, %s)' % (name, key, PERIOD))
+    else:
+        for name, key in SIDES:
+            op.execute('ALTER TABLE show ADD CONSTRAINT %s EXCLUDE USING gist (%s WITH =, %s WITH &&)'
+                       % (name, key, PERIOD))
+
+
+def downgrade():
+    # btree_gist is left installed
+    for name, _ in SIDES:
+        op.execute('ALTER TABLE show DROP CONSTRAINT IF EXISTS %s' % name)
+        op.execute('DROP INDEX IF EXISTS %s' % name)
+    op.drop_column('show', 'duration')
@@ -1,8 +1,29 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import timedelta
 
-#
-db = SQLAlchemy()
+from sqlalchemy.dialects import postgresql
 
+from enums import Genre
+from routing import RoutingSQLAlchemy
+
+# reads of @read_only views may be routed to a replica (routing.py)
+db = RoutingSQLAlchemy()
+
+
+
+#----------------------------------------------------------------------------#
+# Types.
+#----------------------------------------------------------------------------#
+
+# Genre names (Genre.<name>, as the forms submit them) in a native enum type
+GENRE = postgresql.ENUM(*Genre.__members__, name='genre', create_type=False)
+
+
+class GenreArray(postgresql.ARRAY):
+    # genre[]; psycopg2 sends Python lists as text[], so binds are cast
+    cache_ok = True
+
+    def bind_expression(self, bindvalue):
+        return db.cast(bindvalue, self)
 
 
 #----------------------------------------------------------------------------#
@@ -12,11 +33,19 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city_name_id', 'state', 'city', 'name', 'id'),
+        # ?genre= filters (genres @> ...) and the genre facet
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        # max(updated_at) of the conditional GET validators
+        db.Index('ix_venue_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    # NOT NULL: the listing's keyset cursors compare (state, city, name, id)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -25,23 +54,36 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(GenreArray(GENRE))
+    # drives the ETag / Last-Modified of the pages showing this row
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now())
     
+    # shows are loaded lazily; each view picks its own loader options
     shows = db.relationship(
         'Show', 
         backref='venue', 
-        lazy='joined', 
+        lazy=True, 
         cascade='delete')
     
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    # NOT NULL: the listing's keyset cursors compare (name, id)
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(GenreArray(GENRE))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -49,19 +91,93 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now())
     
     shows = db.relationship(
         'Show', 
         backref='artist',
-        lazy='joined', 
+        lazy=True, 
         cascade='delete')
         
+# A show occupies its venue and its artist for [start_time, start_time + duration)
+SHOW_PERIOD = 'tsrange(start_time, start_time + duration)'
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        # past / upcoming shows of one venue or artist are index range scans
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_updated_at', 'updated_at'),
+        # no double bookings; the GiST indexes behind these also serve the
+        # conflict and availability lookups of scheduling.py
+        postgresql.ExcludeConstraint(
+            ('venue_id', '='), (db.text(SHOW_PERIOD), '&&'), name='show_venue_no_overlap', using='gist'),
+        postgresql.ExcludeConstraint(
+            ('artist_id', '='), (db.text(SHOW_PERIOD), '&&'), name='show_artist_no_overlap', using='gist'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    artist_id = db.Column(db.ForeignKey('artist.id'), primary_key=True)
-    venue_id = db.Column(db.ForeignKey('venue.id'), primary_key=True)
+    artist_id = db.Column(db.ForeignKey('artist.id'), nullable=False)
+    venue_id = db.Column(db.ForeignKey('venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
-    
\ No newline at end of file
+    duration = db.Column(
+        db.Interval,
+        nullable=False,
+        default=DEFAULT_SHOW_DURATION,
+        server_default=db.text("'2 hours'"))
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now())
+    
+
+# Show counts per venue and per artist, kept up to date by stats.ShowStats in
+# the transaction that changes the shows. The counts split at now(), so a row
+# whose next_show_time has passed is stale until refreshed again; readers fall
+# back to counting that venue's or artist's shows directly.
+class VenueStats(db.Model):
+    __tablename__ = 'venue_stats'
+
+    venue_id = db.Column(db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, index=True)
+    last_show_time = db.Column(db.DateTime)
+    refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+
+class ArtistStats(db.Model):
+    __tablename__ = 'artist_stats'
+
+    artist_id = db.Column(db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, index=True)
+    last_show_time = db.Column(db.DateTime)
+    refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+
+class ImportCheckpoint(db.Model):
+    # progress of `flask fyyur import`, committed together with each chunk
+    __tablename__ = 'import_checkpoint'
+
+    source = db.Column(db.String, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    rows_done = db.Column(db.BigInteger, nullable=False, default=0)
+    imported = db.Column(db.BigInteger, nullable=False, default=0)
+    rejected = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now())
@@ -0,0 +1,125 @@
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import tuple_
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# Pages are addressed by the sort key of a boundary row instead of an OFFSET:
+# ?after=<key> returns the rows following that key, ?before=<key> the rows
+# preceding it. The key is the comma separated list of the sort column values
+# (e.g. "The Wild Sax Band,3"), each value percent-encoded so that commas inside
+# names survive. With an index on the sort columns every page is an index range
+# scan, however deep into the listing it is.
+
+def encode_cursor(values):
+    return ','.join(
+        quote(value.isoformat() if isinstance(value, datetime) else str(value), safe='')
+        for value in values)
+
+
+def decode_cursor(raw, columns):
+    parts = raw.split(',')
+    if len(parts) != len(columns):
+        raise ValueError('cursor has %d values, expected %d' % (len(parts), len(columns)))
+
+    values = []
+    for part, column in zip(parts, columns):
+        value = unquote(part)
+        python_type = column.type.python_type
+        if python_type is datetime:
+            values.append(datetime.fromisoformat(value))
+        else:
+            values.append(python_type(value))
+    return tuple(values)
+
+
+class KeysetPage:
+    """One page of a listing ordered by `columns`.
+
+    The last column must make the ordering unique (normally the primary key).
+    Every row handed to `fetch` must expose the columns as attributes, which
+    both ORM entities and `Row` tuples selected with those columns do.
+    """
+
+    def __init__(self, columns, after=None, before=None, limit=None):
+        self.columns = columns
+        self.after = after
+        self.before = before
+        self.limit = limit or current_app.config['PAGE_SIZE']
+        self.items = []
+        self.has_next = False
+        self.has_prev = False
+
+    @classmethod
+    def from_request(cls, columns):
+        # reads ?after= / ?before= / ?limit= from the current request
+        try:
+            after = request.args.get('after')
+            before = request.args.get('before')
+            limit = request.args.get('limit', type=int)
+            if after:
+                after = decode_cursor(after, columns)
+            if before:
+                before = decode_cursor(before, columns)
+        except ValueError:
+            abort(400)
+
+        if limit is not None:
+            limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+        return cls(columns, after=after or None, before=before or None, limit=limit)
+
+    def fetch(self, query, execute=None):
+        # `query` is a Query, or a select() that `execute` turns into rows
+        key = tuple_(*self.columns)
+        if self.before is not None:
+            # walk backwards from the cursor, then restore the display order
+            query = query.filter(key < tuple_(*self.before)).order_by(*[c.desc() for c in self.columns])
+        else:
+            if self.after is not None:
+                query = query.filter(key > tuple_(*self.after))
+            query = query.order_by(*self.columns)
+
+        # one extra row tells whether there is anything beyond this page
+        query = query.limit(self.limit + 1)
+        rows = execute(query) if execute is not None else query.all()
+        more = len(rows) > self.limit
+        rows = rows[:self.limit]
+
+        if self.before is not None:
+            rows.reverse()
+            self.has_prev = more
+            self.has_next = True
+        else:
+            self.has_next = more
+            self.has_prev = self.after is not None
+
+        self.items = rows
+        return rows
+
+    def key(self, row):
+        return [getattr(row, column.key) for column in self.columns]
+
+    @property
+    def next_url(self):
+        if not (self.has_next and self.items):
+            return None
+        return self._url(after=encode_cursor(self.key(self.items[-1])))
+
+    @property
+    def prev_url(self):
+        if not (self.has_prev and self.items):
+            return None
+        return self._url(before=encode_cursor(self.key(self.items[0])))
+
+    def _url(self, **cursor):
+        # keep any other query arguments (limit, filters) on the new link
+        args = request.args.to_dict(flat=False)
+        args.pop('after', None)
+        args.pop('before', None)
+        args.update(cursor)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
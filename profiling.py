@@ -0,0 +1,209 @@
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from logging import FileHandler, Formatter
+
+from flask import g, has_request_context, jsonify, request
+from flask.signals import before_render_template, signals_available, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+class JSONFormatter(Formatter):
+    # one JSON object per line; extra fields passed as `extra={'fields': {...}}`
+
+    def format(self, record):
+        line = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'where': '%s:%d' % (record.pathname, record.lineno),
+        }
+        line.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+def configure_logging(app):
+    if app.debug:
+        return
+    file_handler = FileHandler(app.config.get('LOG_FILE', 'error.log'))
+    file_handler.setFormatter(JSONFormatter())
+    file_handler.setLevel(logging.INFO)
+    app.logger.setLevel(logging.INFO)
+    app.logger.addHandler(file_handler)
+
+
+#----------------------------------------------------------------------------#
+# Request profiling.
+#----------------------------------------------------------------------------#
+
+# Upper bounds (ms) of the latency histogram buckets on /_debug/profile
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+
+class EndpointStats:
+    # rolling window of the last `window` requests of one endpoint
+
+    def __init__(self, window):
+        self.durations = deque(maxlen=window)
+        self.queries = deque(maxlen=window)
+        self.db_ms = deque(maxlen=window)
+        self.n_plus_one = 0
+
+    def add(self, duration_ms, queries, db_ms, n_plus_one):
+        self.durations.append(duration_ms)
+        self.queries.append(queries)
+        self.db_ms.append(db_ms)
+        if n_plus_one:
+            self.n_plus_one += 1
+
+    def summary(self):
+        durations = sorted(self.durations)
+        if len(durations) > 1:
+            cuts = statistics.quantiles(durations, n=100, method='inclusive')
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = durations[0] if durations else 0.0
+
+        histogram = {}
+        for bound in BUCKETS_MS:
+            label = 'le_inf' if bound == float('inf') else 'le_%d' % bound
+            histogram[label] = sum(1 for d in durations if d <= bound)
+        return {
+            'requests': len(durations),
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'mean_queries': round(statistics.fmean(self.queries), 2) if self.queries else 0,
+            'mean_db_ms': round(statistics.fmean(self.db_ms), 2) if self.db_ms else 0,
+            'n_plus_one_requests': self.n_plus_one,
+            'histogram': histogram,
+        }
+
+
+class Profiler:
+    """Opt-in per-request instrumentation (PROFILING_ENABLED = True).
+
+    Counts SQL statements, database time and rows fetched through engine
+    events, times template rendering through Flask's render signals, and flags
+    any statement run PROFILING_N_PLUS_ONE_THRESHOLD or more times in one
+    request. Each response gets a Server-Timing header and a JSON log line;
+    /_debug/profile serves rolling per-endpoint statistics.
+    """
+
+    def __init__(self, app=None):
+        self.stats = defaultdict(lambda: EndpointStats(self.window))
+        self.lock = threading.Lock()
+        self.window = 1000
+        self.n_plus_one_threshold = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+        self.window = app.config.get('PROFILING_WINDOW', 1000)
+        self.n_plus_one_threshold = app.config.get('PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+        self.logger = app.logger
+
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        if signals_available:
+            before_render_template.connect(self._before_render, app)
+            template_rendered.connect(self._after_render, app)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/_debug/profile', 'debug_profile', self.report)
+        app.extensions['profiler'] = self
+
+    # per request -------------------------------------------------------------
+
+    def _before_request(self):
+        g.profile = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'db_ms': 0.0,
+            'rows': 0,
+            'template_ms': 0.0,
+            'statements': Counter(),
+        }
+
+    def _after_request(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile['started']) * 1000
+        repeated = {statement: count for statement, count in profile['statements'].items()
+                    if count >= self.n_plus_one_threshold}
+
+        response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d queries, %d rows"'
+                             % (profile['db_ms'], profile['queries'], profile['rows']))
+        response.headers.add('Server-Timing', 'tpl;dur=%.1f' % profile['template_ms'])
+        response.headers.add('Server-Timing', 'total;dur=%.1f' % total_ms)
+
+        with self.lock:
+            self.stats[request.endpoint or request.path].add(
+                total_ms, profile['queries'], profile['db_ms'], bool(repeated))
+
+        self.logger.log(logging.WARNING if repeated else logging.INFO, 'request', extra={'fields': {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'queries': profile['queries'],
+            'db_ms': round(profile['db_ms'], 2),
+            'rows': profile['rows'],
+            'template_ms': round(profile['template_ms'], 2),
+            'n_plus_one': [{'statement': statement, 'count': count} for statement, count in repeated.items()],
+        }})
+        return response
+
+    # SQLAlchemy engine events -------------------------------------------------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profile_started'].pop()
+        if not has_request_context() or 'profile' not in g:
+            return
+        profile = g.profile
+        profile['queries'] += 1
+        profile['db_ms'] += (time.perf_counter() - started) * 1000
+        profile['rows'] += max(cursor.rowcount, 0)
+        profile['statements'][statement] += 1
+
+    def _handle_error(self, exception_context):
+        # a failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('profile_started'):
+            connection.info['profile_started'].pop()
+
+    # Flask template signals ---------------------------------------------------
+
+    def _before_render(self, sender, template, context, **extra):
+        if 'profile' in g:
+            g.profile.setdefault('render_started', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if 'profile' in g and g.profile.get('render_started'):
+            started = g.profile['render_started'].pop()
+            g.profile['template_ms'] += (time.perf_counter() - started) * 1000
+
+    # /_debug/profile ---------------------------------------------------------
+
+    def report(self):
+        with self.lock:
+            return jsonify({endpoint: stats.summary() for endpoint, stats in sorted(self.stats.items())})
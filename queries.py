@@ -0,0 +1,315 @@
+import re
+from datetime import datetime
+
+from flask import abort, current_app, request
+from sqlalchemy import desc, select, true, tuple_
+
+from enums import Genre, State
+from models import db, Venue, Artist, Show
+from stats import STATS, show_counts, with_stats
+
+
+#----------------------------------------------------------------------------#
+# Queries shared by the HTML views and the JSON API.
+#----------------------------------------------------------------------------#
+
+def show_statements(model, owner_id, other_key):
+    # Past and upcoming shows of one venue (or artist), each a bounded range
+    # scan of the (owner_id, start_time) index, plus both totals read from
+    # its stats row. Only the id of the far side (`other_key`) is selected;
+    # References resolves it.
+    owner_key = STATS[model][2]
+    now = db.func.now()
+    limit = current_app.config['SHOWS_PER_SECTION']
+    shows = select(other_key, Show.start_time).where(owner_key == owner_id)
+
+    past = shows.where(Show.start_time <= now).order_by(desc(Show.start_time)).limit(limit)
+    upcoming = shows.where(Show.start_time > now).order_by(Show.start_time).limit(limit)
+    counts = with_stats(model, select(*show_counts(model)).select_from(model)).where(model.id == owner_id)
+    return past, upcoming, counts
+
+
+def split_shows(model, owner_id, other, other_key):
+    # (past, upcoming, past_count, upcoming_count), the shows with their far side resolved
+    past, upcoming, counts = show_statements(model, owner_id, other_key)
+    counts = db.session.execute(counts).one()
+    past, upcoming = db.session.execute(past).all(), db.session.execute(upcoming).all()
+    past, upcoming = References(other, other_key).load(past, upcoming)
+    return past, upcoming, counts[0], counts[1]
+
+
+#----------------------------------------------------------------------------#
+# References.
+#----------------------------------------------------------------------------#
+
+class References:
+    """Batch resolver for the venues or artists that rows point at.
+
+    Rows are selected without joining the far side. `load` collects the ids
+    of every row list it is given and fetches (id, name, image_link) for the
+    ones it has not seen yet in one IN query, so a page costs the same number
+    of queries however many shows it lists. Rows come back as dicts with
+    <side>_name and <side>_image_link added, e.g. artist_name for artist_id.
+    """
+
+    def __init__(self, model, key):
+        self.model = model
+        self.key = key.key
+        side = self.key[:-len('_id')]
+        self.fields = (side + '_name', side + '_image_link')
+        self.resolved = {}
+
+    def _missing(self, row_lists):
+        ids = {getattr(row, self.key) for rows in row_lists for row in rows}
+        return ids.difference(self.resolved)
+
+    def _statement(self, ids):
+        model = self.model
+        return select(model.id, model.name, model.image_link).where(model.id.in_(sorted(ids)))
+
+    def _attach(self, found, row_lists):
+        for row in found:
+            self.resolved[row.id] = (row.name, row.image_link)
+        unknown = (None, None)
+        return [[dict(row._asdict(), **dict(zip(self.fields, self.resolved.get(getattr(row, self.key), unknown))))
+                 for row in rows] for rows in row_lists]
+
+    def load(self, *row_lists):
+        missing = self._missing(row_lists)
+        found = db.session.execute(self._statement(missing)).all() if missing else []
+        return self._attach(found, row_lists)
+
+    async def load_async(self, async_db, *row_lists):
+        missing = self._missing(row_lists)
+        found = await async_db.fetch(self._statement(missing)) if missing else []
+        return self._attach(found, row_lists)
+
+
+#----------------------------------------------------------------------------#
+# Listings.
+#----------------------------------------------------------------------------#
+
+def _requested(name, allowed):
+    # the repeated, non-empty ?<name>= values, all of them members of `allowed`
+    values = [value for value in request.args.getlist(name) if value]
+    unknown = [value for value in values if value not in allowed]
+    if unknown:
+        abort(400, description='unknown %s values: %s' % (name, ', '.join(unknown)))
+    return sorted(set(values))
+
+
+def _requested_time(name):
+    # ?<name>= as an ISO 8601 date or datetime, None when absent
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, description='%s must be an ISO 8601 date or datetime' % name)
+
+
+def listing_filters(model):
+    # conditions for ?genre=Jazz&genre=Blues&state=CA: every listed genre
+    # (genres @> ..., served by the GIN index) and any of the listed states
+    genres = _requested('genre', Genre.__members__)
+    states = _requested('state', State.__members__)
+
+    conditions = []
+    if genres:
+        conditions.append(model.genres.contains(genres))
+    if states:
+        conditions.append(model.state.in_(states))
+    return conditions
+
+
+def show_filters():
+    # conditions for ?from=&to=&city=&genre= on /shows: a start_time range
+    # (the ix_show_start_time_id index), the venue's city and the artist's genres
+    start, end = _requested_time('from'), _requested_time('to')
+    city = request.args.get('city', '').strip()
+    genres = _requested('genre', Genre.__members__)
+
+    conditions = []
+    if start is not None:
+        conditions.append(Show.start_time >= start)
+    if end is not None:
+        conditions.append(Show.start_time < end)
+    if city:
+        conditions.append(db.func.lower(Venue.city) == city.lower())
+    if genres:
+        conditions.append(Artist.genres.contains(genres))
+    return conditions
+
+
+def facets(model, conditions=()):
+    # {'genres': {name: count}, 'states': {name: count}} over the rows
+    # matching `conditions`, in one pass: the genres are unnested and both
+    # facets come out of a single GROUPING SETS aggregate.
+    genre = db.func.unnest(model.genres).table_valued('genre').render_derived().lateral('g')
+    query = db.session.query(
+        genre.c.genre, model.state, db.func.grouping(genre.c.genre),
+        db.func.count(model.id.distinct())
+    ).select_from(model).outerjoin(genre, true()).filter(*conditions).group_by(
+        db.func.grouping_sets(tuple_(genre.c.genre), tuple_(model.state)))
+
+    result = {'genres': {}, 'states': {}}
+    for name, state, by_state, count in query:
+        if by_state:
+            if state is not None:
+                result['states'][state] = count
+        elif name is not None:
+            result['genres'][name] = count
+    return result
+
+
+def read_rows(statement):
+    """Plain Core rows of a select(), for pages that only render columns.
+
+    The statement runs on the session's connection (a replica's in @read_only
+    views) without the ORM loading step: nothing is hydrated into entities
+    or tracked in the identity map. `flask fyyur bench-rows` compares this
+    with loading entities.
+    """
+    return db.session.connection().execute(statement).all()
+
+
+def venues_page(page, conditions=()):
+    # venues sorted by area, with upcoming show counts from venue_stats
+    upcoming = show_counts(Venue)[1].label('num_upcoming_shows')
+    statement = with_stats(Venue, select(Venue.id, Venue.name, Venue.city, Venue.state, upcoming))
+    return page.fetch(statement.where(*conditions), read_rows)
+
+
+def artists_page(page, conditions=()):
+    return page.fetch(select(Artist.id, Artist.name).where(*conditions), read_rows)
+
+
+def shows_page(page, conditions=()):
+    # shows in start_time order, joined to just the venue and artist columns shown
+    statement = select(
+        Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+        Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'))
+    statement = statement.join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id)
+    return page.fetch(statement.where(*conditions), read_rows)
+
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+# the far side of a venue's shows, and of an artist's
+VENUE_SHOWS = (Artist, Show.artist_id)
+ARTIST_SHOWS = (Venue, Show.venue_id)
+
+
+def venue_data(venue):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+    }
+
+
+def artist_data(artist):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+    }
+
+
+def shows_data(past_shows, upcoming_shows, past_count, upcoming_count):
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": past_count,
+        "upcoming_shows_count": upcoming_count,
+    }
+
+
+def _detail(model, to_data, shows, id, with_shows):
+    data = to_data(model.query.get_or_404(id))
+    if with_shows:
+        data.update(shows_data(*split_shows(model, id, *shows)))
+    return data
+
+
+async def _detail_async(async_db, model, to_data, shows, id, with_shows):
+    # the row and the three show queries are all in flight at once; the far
+    # sides of the shows follow in one more
+    statements = [select(*model.__table__.c).where(model.id == id)]
+    if with_shows:
+        statements.extend(show_statements(model, id, shows[1]))
+    results = await async_db.gather(*statements)
+    if not results[0]:
+        abort(404)
+
+    data = to_data(results[0][0])
+    if with_shows:
+        past, upcoming, counts = results[1:]
+        past, upcoming = await References(*shows).load_async(async_db, past, upcoming)
+        data.update(shows_data(past, upcoming, *counts[0]))
+    return data
+
+
+def venue_detail(venue_id, with_shows=True):
+    async_db = current_app.extensions.get('async_db')
+    if async_db is not None and async_db.enabled:
+        return async_db.run(_detail_async(async_db, Venue, venue_data, VENUE_SHOWS, venue_id, with_shows))
+    return _detail(Venue, venue_data, VENUE_SHOWS, venue_id, with_shows)
+
+
+def artist_detail(artist_id, with_shows=True):
+    async_db = current_app.extensions.get('async_db')
+    if async_db is not None and async_db.enabled:
+        return async_db.run(_detail_async(async_db, Artist, artist_data, ARTIST_SHOWS, artist_id, with_shows))
+    return _detail(Artist, artist_data, ARTIST_SHOWS, artist_id, with_shows)
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# "San Francisco, CA" style terms search by location instead of by name
+LOCATION_TERM = re.compile(r'^\s*(?P<city>[^,]+?)\s*,\s*(?P<state>[A-Za-z]{2})\s*$')
+
+
+def search_query(model, search_term):
+    # Both branches are written against lower(...) so they can use the
+    # indexes from migration 3f5a2b9d4c81: the pg_trgm GIN index on lower(name)
+    # serves the LIKE, the (state, lower(city)) index serves location terms.
+    # Upcoming show counts come from the stats tables.
+    term = search_term.strip().lower()
+    query = with_stats(model, select(model.id, model.name, show_counts(model)[1].label('num_upcoming_shows')))
+
+    location = LOCATION_TERM.match(term)
+    if location and location.group('state').upper() in State.__members__:
+        query = query.filter(
+            model.state == location.group('state').upper(),
+            db.func.lower(model.city) == location.group('city')
+        ).order_by(model.name)
+    else:
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+        query = query.filter(
+            db.func.lower(model.name).like(pattern, escape='\\')
+        ).order_by(desc(db.func.similarity(db.func.lower(model.name), term)), model.name)
+
+    return read_rows(query.limit(current_app.config['SEARCH_RESULTS_LIMIT']))
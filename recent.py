@@ -0,0 +1,228 @@
+import pickle
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc, event, select
+
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# latest venues, artists and shows, and the listings (upcoming shows with the
+# time they were listed) that trending venues are counted from
+KINDS = ('venues', 'artists', 'shows', 'listings')
+
+
+class MemoryRecent:
+    # Per worker. A worker only sees its own commits, so the lists are
+    # reseeded from the database every `reseed_after` seconds.
+
+    def __init__(self, sizes, reseed_after):
+        self.sizes = sizes
+        self.reseed_after = reseed_after
+        self.lists = None
+        self.seeded_at = float('-inf')
+        self.lock = threading.Lock()
+
+    def seeded(self):
+        return self.lists is not None and time.monotonic() - self.seeded_at < self.reseed_after
+
+    def replace(self, lists):
+        with self.lock:
+            self.lists = {kind: deque(lists[kind], maxlen=self.sizes[kind]) for kind in KINDS}
+            self.seeded_at = time.monotonic()
+
+    def push(self, kind, items):
+        # items newest last
+        with self.lock:
+            if self.lists is not None:
+                self.lists[kind].extendleft(items)
+
+    def items(self, kind):
+        with self.lock:
+            return list(self.lists[kind]) if self.lists is not None else []
+
+    def invalidate(self):
+        with self.lock:
+            self.lists = None
+
+
+class RedisRecent:
+    # Shared by every worker: one capped Redis list per kind, pushed to with
+    # LPUSH + LTRIM. A missing marker key means the lists need a reseed.
+
+    def __init__(self, url, prefix, sizes):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RECENT_BACKEND = 'redis' needs the redis package installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.sizes = sizes
+
+    def _key(self, kind):
+        return '%s:recent:%s' % (self.prefix, kind)
+
+    def seeded(self):
+        return bool(self.client.exists(self._key('seeded')))
+
+    def replace(self, lists):
+        pipeline = self.client.pipeline()
+        for kind in KINDS:
+            pipeline.delete(self._key(kind))
+            if lists[kind]:
+                pipeline.rpush(self._key(kind), *(pickle.dumps(item) for item in lists[kind]))
+        pipeline.set(self._key('seeded'), 1)
+        pipeline.execute()
+
+    def push(self, kind, items):
+        pipeline = self.client.pipeline()
+        pipeline.lpush(self._key(kind), *(pickle.dumps(item) for item in items))
+        pipeline.ltrim(self._key(kind), 0, self.sizes[kind] - 1)
+        pipeline.execute()
+
+    def items(self, kind):
+        return [pickle.loads(item) for item in self.client.lrange(self._key(kind), 0, -1)]
+
+    def invalidate(self):
+        self.client.delete(self._key('seeded'))
+
+
+#----------------------------------------------------------------------------#
+# Recent items.
+#----------------------------------------------------------------------------#
+
+class RecentItems:
+    """The home page's latest venues, artists and shows and trending venues.
+
+    The lists are seeded from the database on first use and then kept up to
+    date by the commits that create venues, artists and shows, so rendering
+    them costs no query. Edits and deletes of those rows are rarer; they mark
+    the lists for a reseed instead of patching them.
+
+    Trending venues are those with the most upcoming shows listed in the
+    last RECENT_TRENDING_DAYS days. A show's listing time is taken from its
+    updated_at column when seeding.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.size = app.config.get('RECENT_SIZE', 10)
+        self.trending_days = app.config.get('RECENT_TRENDING_DAYS', 7)
+        self.trending_size = app.config.get('RECENT_TRENDING_SIZE', 5)
+        sizes = {'venues': self.size, 'artists': self.size, 'shows': self.size,
+                 'listings': app.config.get('RECENT_TRENDING_EVENTS', 5000)}
+
+        backend = app.config.get('RECENT_BACKEND', 'memory')
+        if backend == 'memory':
+            self.backend = MemoryRecent(sizes, app.config.get('RECENT_RESEED_SECONDS', 60))
+        elif backend == 'redis':
+            self.backend = RedisRecent(app.config['CACHE_REDIS_URL'],
+                                       app.config.get('CACHE_KEY_PREFIX', 'fyyur'), sizes)
+        else:
+            raise ValueError('unknown RECENT_BACKEND %r' % backend)
+        self.sizes = sizes
+        app.extensions['recent_items'] = self
+
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def snapshot(self):
+        # {'venues', 'artists', 'shows', 'trending'} for the home page
+        if not self.backend.seeded():
+            self.seed()
+        return {
+            'venues': self.backend.items('venues'),
+            'artists': self.backend.items('artists'),
+            'shows': self.backend.items('shows'),
+            'trending': self.trending(),
+        }
+
+    def trending(self):
+        now = datetime.now()
+        listed_since = time.time() - self.trending_days * 86400
+        counts, names = Counter(), {}
+        for listed_at, venue_id, venue_name, start_time in self.backend.items('listings'):
+            if listed_at >= listed_since and start_time > now:
+                counts[venue_id] += 1
+                names[venue_id] = venue_name
+        return [{'id': venue_id, 'name': names[venue_id], 'upcoming_shows': count}
+                for venue_id, count in counts.most_common(self.trending_size)]
+
+    def seed(self):
+        session = db.session
+        lists = {
+            'venues': [row._asdict() for row in session.execute(
+                select(Venue.id, Venue.name).order_by(desc(Venue.id)).limit(self.size))],
+            'artists': [row._asdict() for row in session.execute(
+                select(Artist.id, Artist.name).order_by(desc(Artist.id)).limit(self.size))],
+            'shows': [row._asdict() for row in session.execute(
+                self._show_items().order_by(desc(Show.id)).limit(self.size))],
+            'listings': [
+                (row.updated_at.timestamp(), row.venue_id, row.venue_name, row.start_time)
+                for row in session.execute(
+                    select(Show.updated_at, Show.venue_id, Venue.name.label('venue_name'), Show.start_time)
+                    .join(Venue, Show.venue_id == Venue.id)
+                    .where(Show.start_time > db.func.now(),
+                           Show.updated_at >= db.func.now() - timedelta(days=self.trending_days))
+                    .order_by(desc(Show.updated_at)).limit(self.sizes['listings']))],
+        }
+        self.backend.replace(lists)
+
+    def clear(self):
+        # after writes that bypass the session hooks (the importer)
+        self.backend.invalidate()
+
+    def _show_items(self):
+        return select(
+            Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+            Show.artist_id, Artist.name.label('artist_name')
+        ).join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id)
+
+    # update hooks ------------------------------------------------------------
+
+    def _after_flush(self, session, flush_context):
+        tracked = (Venue, Artist, Show)
+        if any(isinstance(obj, tracked) for obj in (*session.dirty, *session.deleted)):
+            session.info['recent_reseed'] = True
+
+        pending = session.info.setdefault('recent_items', {kind: [] for kind in KINDS})
+        new_shows = []
+        for obj in session.new:
+            if isinstance(obj, Venue):
+                pending['venues'].append((obj.id, {'id': obj.id, 'name': obj.name}))
+            elif isinstance(obj, Artist):
+                pending['artists'].append((obj.id, {'id': obj.id, 'name': obj.name}))
+            elif isinstance(obj, Show):
+                new_shows.append(obj.id)
+
+        if new_shows:
+            # the names the home page shows, read in this transaction
+            for row in session.execute(self._show_items().where(Show.id.in_(new_shows))):
+                pending['shows'].append((row.id, row._asdict()))
+                if row.start_time > datetime.now():
+                    pending['listings'].append((row.id, (time.time(), row.venue_id, row.venue_name, row.start_time)))
+
+    def _after_commit(self, session):
+        pending = session.info.pop('recent_items', None)
+        if session.info.pop('recent_reseed', False):
+            self.backend.invalidate()
+        elif pending:
+            for kind, items in pending.items():
+                if items:
+                    # oldest first, so the newest ends up at the front
+                    self.backend.push(kind, [item for _, item in sorted(items, key=lambda entry: entry[0])])
+
+    def _after_rollback(self, session):
+        session.info.pop('recent_items', None)
+        session.info.pop('recent_reseed', None)
@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session as flask_session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm, text
+
+
+#----------------------------------------------------------------------------#
+# Routing session.
+#----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+    # Reads of a request the ReplicaRouter marked for a replica go to that
+    # replica; flushes, and anything outside such a request, go to the primary.
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self._flushing and has_request_context():
+            router = self.app.extensions.get('replicas')
+            engine = router.engine_for_request() if router is not None else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+#----------------------------------------------------------------------------#
+# Replica router.
+#----------------------------------------------------------------------------#
+
+def read_only(view):
+    # marks a view whose queries may be served by a replica; goes right
+    # under the route decorator so that it covers the ETag and cache lookups
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything
+# it received, or when it is not a standby at all.
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """Sends the queries of read-only endpoints to the SQLALCHEMY_BINDS replicas.
+
+    Views opt in with @read_only. A visitor whose commit wrote
+    something is pinned to the primary for REPLICA_STICKY_SECONDS, so the
+    redirect after a form submission shows their own change. Replicas
+    further behind than REPLICA_MAX_LAG_SECONDS, or unreachable, are
+    skipped until their next lag check; with none left, reads fall back to
+    the primary.
+    """
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.binds = []
+        self.lag = {}
+        self.checked = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.binds = sorted(bind for bind in app.config.get('SQLALCHEMY_BINDS') or {}
+                            if bind.startswith('replica'))
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', 5)
+        self.check_interval = app.config.get('REPLICA_LAG_CHECK_INTERVAL', 5)
+        self.sticky = app.config.get('REPLICA_STICKY_SECONDS', 10)
+        app.extensions['replicas'] = self
+
+        event.listen(self.db.session, 'after_flush', self._after_flush)
+        event.listen(self.db.session, 'after_commit', self._after_commit)
+        event.listen(self.db.session, 'after_rollback', self._after_rollback)
+
+    def engine_for_request(self):
+        if not (self.binds and g.get('db_read_only')):
+            return None
+        if flask_session.get('db_primary_until', 0) >= time.time():
+            return None
+        # one replica per request, so every query sees the same snapshot
+        if 'db_replica' not in g:
+            healthy = [bind for bind in self.binds if self.healthy(bind)]
+            g.db_replica = self.db.get_engine(self.app, bind=random.choice(healthy)) if healthy else None
+        return g.db_replica
+
+    def healthy(self, bind):
+        # one thread re-measures a stale lag; the others use the last value
+        now = time.monotonic()
+        if now - self.checked.get(bind, float('-inf')) >= self.check_interval and self.lock.acquire(blocking=False):
+            try:
+                self.lag[bind] = self.measure_lag(bind)
+                self.checked[bind] = now
+            finally:
+                self.lock.release()
+        lag = self.lag.get(bind)
+        return lag is not None and lag <= self.max_lag
+
+    def measure_lag(self, bind):
+        # None when the replica cannot be reached
+        try:
+            with self.db.get_engine(self.app, bind=bind).connect() as connection:
+                return float(connection.execute(LAG_QUERY).scalar())
+        except Exception:
+            self.app.logger.warning('replica %s is unreachable', bind, exc_info=True)
+            return None
+
+    # read-after-write stickiness ---------------------------------------------
+
+    def _after_flush(self, session, flush_context):
+        if session.new or session.dirty or session.deleted:
+            session.info['replica_wrote'] = True
+
+    def _after_commit(self, session):
+        if session.info.pop('replica_wrote', False) and self.binds and has_request_context():
+            flask_session['db_primary_until'] = time.time() + self.sticky
+
+    def _after_rollback(self, session):
+        session.info.pop('replica_wrote', None)
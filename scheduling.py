@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+from flask import abort, current_app, request
+from sqlalchemy import DateTime, Integer, and_, column, or_, select, values
+
+from models import db, Show, DEFAULT_SHOW_DURATION
+
+
+#----------------------------------------------------------------------------#
+# Scheduling.
+#----------------------------------------------------------------------------#
+
+# Shows may not overlap at their venue or for their artist. The exclusion
+# constraints show_venue_no_overlap / show_artist_no_overlap enforce it (on a
+# partitioned show, the show_no_overlap trigger raises the same error); the
+# lookups below are written against the same (id, tsrange(...)) expressions so
+# that they are served by the GiST indexes behind those constraints.
+
+EXCLUSION_VIOLATION = '23P01'
+
+# models.SHOW_PERIOD, qualified with the table
+period = db.func.tsrange(Show.start_time, Show.start_time + Show.duration)
+
+
+def overlapping(start, end):
+    # shows whose period overlaps [start, end)
+    return period.op('&&')(db.func.tsrange(start, end))
+
+
+def is_conflict(error):
+    # an IntegrityError raised by one of the exclusion constraints
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+def conflicts(venue_id, artist_id, start_time, duration=None):
+    """Shows already booking the venue or the artist during the given slot."""
+    end_time = start_time + (duration or DEFAULT_SHOW_DURATION)
+    return db.session.execute(
+        select(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration)
+        .where(or_(Show.venue_id == venue_id, Show.artist_id == artist_id), overlapping(start_time, end_time))
+        .order_by(Show.start_time)
+    ).all()
+
+
+def chunk_conflicts(rows):
+    """Indexes of the `rows` (dicts with venue_id, artist_id, start_time and
+    optionally duration) that would break the exclusion constraints: those
+    overlapping a stored show, found in one query, and those overlapping an
+    earlier row of the same chunk.
+    """
+    if not rows:
+        return set()
+
+    slots = [(row['start_time'], row['start_time'] + (row.get('duration') or DEFAULT_SHOW_DURATION))
+             for row in rows]
+    candidates = values(
+        column('i', Integer), column('venue_id', Integer), column('artist_id', Integer),
+        column('start_time', DateTime), column('end_time', DateTime), name='candidate'
+    ).data([(i, row['venue_id'], row['artist_id'], *slots[i]) for i, row in enumerate(rows)])
+    clashing = select(candidates.c.i).distinct().join(Show, and_(
+        or_(Show.venue_id == candidates.c.venue_id, Show.artist_id == candidates.c.artist_id),
+        overlapping(candidates.c.start_time, candidates.c.end_time)))
+    rejected = set(db.session.execute(clashing).scalars())
+
+    # within the chunk: a sweep per venue and per artist over the rows kept so far
+    booked = {}
+    for i, row in enumerate(rows):
+        if i in rejected:
+            continue
+        start, end = slots[i]
+        keys = (('venue', row['venue_id']), ('artist', row['artist_id']))
+        if any(start < other_end and other_start < end
+               for key in keys for other_start, other_end in booked.get(key, ())):
+            rejected.add(i)
+            continue
+        for key in keys:
+            booked.setdefault(key, []).append((start, end))
+    return rejected
+
+
+def requested_window():
+    # [?from=, ?to=) as ISO 8601 datetimes; the coming week by default
+    try:
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else datetime.now()
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else start + timedelta(days=7)
+    except ValueError:
+        abort(400, description='from and to must be ISO 8601 datetimes')
+    if end <= start:
+        abort(400, description='to must be after from')
+    if end - start > timedelta(days=current_app.config['AVAILABILITY_MAX_DAYS']):
+        abort(400, description='at most %d days at a time' % current_app.config['AVAILABILITY_MAX_DAYS'])
+    return start, end
+
+
+def availability(owner_key, owner_id, start, end):
+    """The shows booked for one venue (or artist) within [start, end) and the
+    free gaps between them, clipped to the window.
+    """
+    booked = db.session.execute(
+        select(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration)
+        .where(owner_key == owner_id, overlapping(start, end))
+        .order_by(Show.start_time)
+    ).all()
+
+    free, cursor = [], start
+    for show in booked:
+        if show.start_time > cursor:
+            free.append({'start': cursor, 'end': show.start_time})
+        cursor = max(cursor, show.start_time + show.duration)
+    if cursor < end:
+        free.append({'start': cursor, 'end': end})
+
+    return {
+        'from': start,
+        'to': end,
+        'booked': [{
+            'show_id': show.id,
+            'venue_id': show.venue_id,
+            'artist_id': show.artist_id,
+            'start': show.start_time,
+            'end': show.start_time + show.duration,
+        } for show in booked],
+        'free': free,
+    }
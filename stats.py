@@ -0,0 +1,132 @@
+from sqlalchemy import and_, case, event, exists, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats
+
+
+#----------------------------------------------------------------------------#
+# Show statistics.
+#----------------------------------------------------------------------------#
+
+# owner model -> (stats model, its key column, the show column pointing at the owner)
+STATS = {
+    Venue: (VenueStats, VenueStats.venue_id, Show.venue_id),
+    Artist: (ArtistStats, ArtistStats.artist_id, Show.artist_id),
+}
+
+
+def refresh_statement(model, ids=None, stale=False, missing=False):
+    # INSERT ... SELECT ... ON CONFLICT DO UPDATE of the stats rows of `model`:
+    # the given ids, or the stale and/or missing rows, or every row.
+    stats, stats_key, owner_key = STATS[model]
+    now = db.func.now()
+    source = select(
+        model.id,
+        db.func.count(Show.id).filter(Show.start_time <= now),
+        db.func.count(Show.id).filter(Show.start_time > now),
+        db.func.min(Show.start_time).filter(Show.start_time > now),
+        db.func.max(Show.start_time).filter(Show.start_time <= now),
+    ).select_from(model).outerjoin(Show, owner_key == model.id).group_by(model.id)
+
+    if ids is not None:
+        source = source.where(model.id.in_(ids))
+    conditions = []
+    if stale:
+        conditions.append(model.id.in_(select(stats_key).where(stats.next_show_time <= now)))
+    if missing:
+        conditions.append(~exists().where(stats_key == model.id))
+    if conditions:
+        source = source.where(or_(*conditions))
+
+    statement = insert(stats.__table__).from_select(
+        [stats_key.key, 'past_shows_count', 'upcoming_shows_count', 'next_show_time', 'last_show_time'],
+        source)
+    return statement.on_conflict_do_update(
+        index_elements=[stats_key.key],
+        set_={
+            'past_shows_count': statement.excluded.past_shows_count,
+            'upcoming_shows_count': statement.excluded.upcoming_shows_count,
+            'next_show_time': statement.excluded.next_show_time,
+            'last_show_time': statement.excluded.last_show_time,
+            'refreshed_at': now,
+        })
+
+
+def refresh(model, ids=None, stale=False, missing=False, session=None):
+    if ids is not None and not ids:
+        return 0
+    return (session or db.session).execute(refresh_statement(model, ids, stale, missing)).rowcount
+
+
+def show_counts(model):
+    """(past, upcoming) count expressions for the `model` rows of a query
+    that outer-joins the model's stats table.
+
+    A fresh stats row is read as is. Without one, or once its next show has
+    started, the shows of that one venue or artist are counted instead.
+    """
+    stats, stats_key, owner_key = STATS[model]
+    now = db.func.now()
+    fresh = and_(stats_key.isnot(None), or_(stats.next_show_time.is_(None), stats.next_show_time > now))
+
+    def live(condition):
+        return select(db.func.count()).where(owner_key == model.id, condition).scalar_subquery()
+
+    return (
+        case((fresh, stats.past_shows_count), else_=live(Show.start_time <= now)),
+        case((fresh, stats.upcoming_shows_count), else_=live(Show.start_time > now)),
+    )
+
+
+def with_stats(model, query):
+    # outer-joins the stats of `model` onto a query (or select) over it
+    stats, stats_key, owner_key = STATS[model]
+    return query.outerjoin(stats, stats_key == model.id)
+
+
+class ShowStats:
+    """Refreshes venue_stats / artist_stats in the committing transaction.
+
+    Flushes record the venues and artists whose shows were added, moved or
+    deleted, and the newly created ones; before the commit their rows are
+    recomputed with one statement per table.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['show_stats'] = self
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'before_commit', self._before_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        affected = {Venue: set(), Artist: set()}
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, Show):
+                # both the old and the new venue / artist of a moved show
+                for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+                    history = inspect(obj).attrs[key].history
+                    affected[model].update(id for id in (*history.unchanged, *history.added, *history.deleted)
+                                           if id is not None)
+            elif isinstance(obj, (Venue, Artist)) and obj in session.new:
+                affected[type(obj)].add(obj.id)
+
+        if affected[Venue] or affected[Artist]:
+            recorded = session.info.setdefault('show_stats', {Venue: set(), Artist: set()})
+            for model, ids in affected.items():
+                recorded[model].update(ids)
+
+    def _before_commit(self, session):
+        # pending changes are flushed first, so that their ids are recorded
+        if session.new or session.dirty or session.deleted:
+            session.flush()
+        affected = session.info.pop('show_stats', None)
+        if affected:
+            for model, ids in affected.items():
+                refresh(model, ids, session=session)
+
+    def _after_rollback(self, session):
+        session.info.pop('show_stats', None)
@@ -0,0 +1,77 @@
+import os
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+from sqlalchemy import text
+
+# The tests need a disposable PostgreSQL database. It is migrated to head on
+# first use and emptied before every test:
+#
+#   TEST_DATABASE_URL=postgresql://postgres@localhost:5432/fyyur_test python -m pytest
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    # read by config.py when app.py is imported
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    from flask_migrate import upgrade
+    from app import app
+
+    app.config['TESTING'] = True
+    # every request goes to the database
+    app.extensions['page_cache'].disable()
+    app.extensions['feed_cache'].disable()
+    with app.app_context():
+        upgrade()
+    return app
+
+
+@pytest.fixture
+def db(app):
+    from models import db
+
+    with app.app_context():
+        db.session.execute(text(
+            'TRUNCATE show, venue, artist, venue_stats, artist_stats RESTART IDENTITY CASCADE'))
+        db.session.commit()
+        for name in ('page_cache', 'feed_cache', 'recent_items'):
+            app.extensions[name].clear()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def add_shows(db):
+    """Adds shows at `venue` and by `artist`, or at a new venue / by a new
+    artist each where those are not given. Shows alternate between upcoming
+    and past and are three hours apart across all calls in a test, so no
+    venue or artist is ever double-booked."""
+    from models import Venue, Artist, Show
+
+    slots = count(1)
+    now = datetime.now().replace(microsecond=0)
+
+    def add(number, venue=None, artist=None):
+        shows = []
+        for _ in range(number):
+            slot = next(slots)
+            show_venue = venue or Venue(name='Venue %d' % slot, city='San Francisco', state='CA', genres=['Jazz'])
+            show_artist = artist or Artist(name='Artist %d' % slot, city='San Francisco', state='CA', genres=['Jazz'])
+            db.session.add_all([show_venue, show_artist])
+            db.session.flush()
+            start_time = now + timedelta(hours=3 * slot) * (1 if slot % 2 == 0 else -1)
+            shows.append(Show(venue_id=show_venue.id, artist_id=show_artist.id, start_time=start_time))
+        db.session.add_all(shows)
+        db.session.commit()
+        return shows
+
+    return add
@@ -0,0 +1,44 @@
+import pytest
+
+from bench import QueryCounter
+from models import Venue, Artist, Show
+from queries import venue_detail, artist_detail
+
+
+@pytest.fixture(params=['sync', 'async'])
+def mode(request, app):
+    # the request session, or the asyncpg engine of FYYUR_ASYNC=1
+    async_db = app.extensions['async_db']
+    async_db.enabled = request.param == 'async'
+    yield request.param
+    async_db.enabled = False
+
+
+def statements(detail, id):
+    with QueryCounter() as counter:
+        counter.start()
+        data = detail(id)
+        count, _ = counter.stop()
+    return count, data
+
+
+@pytest.mark.parametrize('detail', [venue_detail, artist_detail])
+def test_detail_statements_do_not_grow_with_shows(db, add_shows, mode, detail):
+    venue = Venue(name='Venue', city='San Francisco', state='CA', genres=['Jazz'])
+    artist = Artist(name='Artist', city='San Francisco', state='CA', genres=['Jazz'])
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    owner_id = venue.id if detail is venue_detail else artist.id
+
+    add_shows(1, venue=venue)
+    add_shows(1, artist=artist)
+    one, data = statements(detail, owner_id)
+    assert data['past_shows_count'] + data['upcoming_shows_count'] == 1
+
+    add_shows(49, venue=venue)
+    add_shows(49, artist=artist)
+    many, data = statements(detail, owner_id)
+    assert data['past_shows_count'] + data['upcoming_shows_count'] == 50
+    # the record, the show counts, past and upcoming shows and one IN query
+    # for their venues (or artists), on either path
+    assert many == one == 5
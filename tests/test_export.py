@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from exporter import stream_export
+from importer import Importer
+from models import Venue, Artist, Show
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_export_imports_back_unchanged(db, tmp_path, fmt):
+    # microseconds are dropped on export, whole seconds survive
+    start_time = (datetime.now() + timedelta(days=1)).replace(microsecond=250000)
+    db.session.add_all([
+        Venue(name='Venue', city='San Francisco', state='CA', address='1 Main St', phone='415-555-0100',
+              genres=['Jazz', 'Blues'], facebook_link='https://www.facebook.com/venue', seeking_talent=False),
+        Artist(name='Artist', city='San Francisco', state='CA', phone='415-555-0101', genres=['Jazz'],
+               facebook_link='https://www.facebook.com/artist', seeking_venue=True),
+    ])
+    db.session.flush()
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start_time, duration=timedelta(minutes=90)))
+    db.session.commit()
+
+    paths = {}
+    for kind in ('venues', 'artists', 'shows'):
+        paths[kind] = tmp_path / ('%s.%s' % (kind, fmt))
+        paths[kind].write_text(''.join(stream_export(kind, fmt)))
+    db.session.remove()
+    db.session.execute(text('TRUNCATE show, venue, artist, venue_stats, artist_stats RESTART IDENTITY CASCADE'))
+    db.session.commit()
+
+    for kind in ('venues', 'artists', 'shows'):
+        checkpoint = Importer(kind, str(paths[kind]), echo=lambda line: None).run()
+        assert (checkpoint.imported, checkpoint.rejected) == (1, 0)
+
+    venue, artist, show = Venue.query.one(), Artist.query.one(), Show.query.one()
+    assert (venue.seeking_talent, venue.genres) == (False, ['Jazz', 'Blues'])
+    assert artist.seeking_venue is True
+    assert (show.start_time, show.duration) == (start_time.replace(microsecond=0), timedelta(minutes=90))
@@ -0,0 +1,83 @@
+import pytest
+
+from bench import QueryCounter
+from enums import Genre, State
+from models import Venue, Artist
+
+
+def statements(client, url):
+    # (SQL statements, rows fetched) of one GET of `url`
+    with QueryCounter() as counter:
+        counter.start()
+        response = client.get(url)
+        response.get_data()
+        count = counter.stop()
+    assert response.status_code == 200
+    return count
+
+
+# Upper bounds on the rows one request fetches, whatever the tables hold:
+# one row of ETag validators, a page plus the row that tells whether there
+# is a next one, and for /venues and /artists a facet row per genre and
+# state (and the NULL genre of venues without any)
+def page_rows(config):
+    return 1 + config['PAGE_SIZE'] + 1
+
+
+def faceted_page_rows(config):
+    return page_rows(config) + len(Genre) + 1 + len(State)
+
+
+# the validators, the record, its show counts, past and upcoming shows and the
+# venues or artists of those shows
+def detail_rows(config):
+    return 3 + 4 * config['SHOWS_PER_SECTION']
+
+
+# route -> statements one request issues, however many rows the tables hold:
+# each reads its ETag validators in one statement, then /venues and /artists
+# a page and the facet counts, /shows one joined page
+LISTINGS = [
+    ('/venues', 3, faceted_page_rows),
+    ('/artists', 3, faceted_page_rows),
+    ('/shows', 2, page_rows),
+]
+
+
+@pytest.mark.parametrize('url, expected, max_rows', LISTINGS)
+def test_listing_statements(app, client, add_shows, url, expected, max_rows):
+    add_shows(6)
+    queries, rows = statements(client, url)
+    assert queries == expected
+    assert rows <= max_rows(app.config)
+
+    # more venues, artists and shows than fit on a page
+    add_shows(app.config['PAGE_SIZE'] + 20)
+    queries, rows = statements(client, url)
+    assert queries == expected
+    assert rows <= max_rows(app.config)
+
+
+# the ETag validators, the record, its show counts, past and upcoming shows and
+# one IN query for the venues or artists of those shows
+@pytest.mark.parametrize('model, expected', [(Venue, 6), (Artist, 6)])
+def test_detail_statements(app, client, db, add_shows, model, expected):
+    show = add_shows(6)[0]
+    owner_id = show.venue_id if model is Venue else show.artist_id
+    url = '/%ss/%d' % (model.__tablename__, owner_id)
+    queries, rows = statements(client, url)
+    assert queries == expected
+    assert rows <= detail_rows(app.config)
+
+    # more past and upcoming shows than a section lists
+    owner = db.session.get(model, owner_id)
+    add_shows(3 * app.config['SHOWS_PER_SECTION'], **{model.__tablename__: owner})
+    queries, rows = statements(client, url)
+    assert queries == expected
+    assert rows <= detail_rows(app.config)
+
+
+def test_index_runs_no_query_once_seeded(client, add_shows):
+    add_shows(6)
+    statements(client, '/')
+    assert statements(client, '/') == (0, 0)